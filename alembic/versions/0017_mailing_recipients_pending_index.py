@@ -0,0 +1,26 @@
+"""mailing recipients pending index
+
+Revision ID: 0017_recipients_pending_index
+Revises: 0016_user_settings
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+
+
+revision = "0017_recipients_pending_index"
+down_revision = "0016_user_settings"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_mailing_recipients_mailing_status_id",
+        "mailing_recipients",
+        ["mailing_id", "status", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_mailing_recipients_mailing_status_id", table_name="mailing_recipients")
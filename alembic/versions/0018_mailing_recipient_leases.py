@@ -0,0 +1,25 @@
+"""mailing recipient leases
+
+Revision ID: 0018_recipient_leases
+Revises: 0017_recipients_pending_index
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0018_recipient_leases"
+down_revision = "0017_recipients_pending_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("mailing_recipients", sa.Column("leased_by", sa.String(length=64), nullable=True))
+    op.add_column("mailing_recipients", sa.Column("lease_expires_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("mailing_recipients", "lease_expires_at")
+    op.drop_column("mailing_recipients", "leased_by")
@@ -0,0 +1,39 @@
+"""resolved peers cache
+
+Revision ID: 0019_resolved_peers
+Revises: 0018_recipient_leases
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0019_resolved_peers"
+down_revision = "0018_recipient_leases"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "resolved_peers",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("account_id", sa.Integer(), nullable=False),
+        sa.Column("peer_key", sa.String(length=80), nullable=False),
+        sa.Column("peer_type", sa.String(length=16), nullable=False),
+        sa.Column("peer_id", sa.BigInteger(), nullable=False),
+        sa.Column("access_hash", sa.BigInteger(), nullable=True),
+        sa.Column("resolved_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index(
+        "ux_resolved_peers_account_key",
+        "resolved_peers",
+        ["account_id", "peer_key"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_resolved_peers_account_key", table_name="resolved_peers")
+    op.drop_table("resolved_peers")
@@ -0,0 +1,26 @@
+"""mailing recipient repeat rounds
+
+Revision ID: 0020_recipient_rounds
+Revises: 0019_resolved_peers
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0020_recipient_rounds"
+down_revision = "0019_resolved_peers"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("mailing_recipients", sa.Column("attempt_round", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("mailing_recipients", sa.Column("next_attempt_at", sa.DateTime(), nullable=True))
+    op.alter_column("mailing_recipients", "attempt_round", server_default=None, existing_type=sa.Integer(), existing_nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column("mailing_recipients", "next_attempt_at")
+    op.drop_column("mailing_recipients", "attempt_round")
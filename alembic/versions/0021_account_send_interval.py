@@ -0,0 +1,23 @@
+"""account send interval
+
+Revision ID: 0021_account_send_interval
+Revises: 0020_recipient_rounds
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0021_account_send_interval"
+down_revision = "0020_recipient_rounds"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("accounts", sa.Column("send_interval_seconds", sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("accounts", "send_interval_seconds")
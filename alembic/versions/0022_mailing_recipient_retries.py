@@ -0,0 +1,24 @@
+"""mailing recipient retries
+
+Revision ID: 0022_recipient_retries
+Revises: 0021_account_send_interval
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0022_recipient_retries"
+down_revision = "0021_account_send_interval"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("mailing_recipients", sa.Column("retry_count", sa.Integer(), nullable=False, server_default="0"))
+    op.alter_column("mailing_recipients", "retry_count", server_default=None, existing_type=sa.Integer(), existing_nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column("mailing_recipients", "retry_count")
@@ -0,0 +1,39 @@
+"""dead peers negative cache
+
+Revision ID: 0023_dead_peers
+Revises: 0022_recipient_retries
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0023_dead_peers"
+down_revision = "0022_recipient_retries"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "dead_peers",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("owner_id", sa.BigInteger(), nullable=False),
+        sa.Column("peer_kind", sa.String(length=8), nullable=False),
+        sa.Column("peer_id", sa.BigInteger(), nullable=False),
+        sa.Column("reason", sa.String(length=255), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index(
+        "ux_dead_peers_owner_peer",
+        "dead_peers",
+        ["owner_id", "peer_kind", "peer_id"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_dead_peers_owner_peer", table_name="dead_peers")
+    op.drop_table("dead_peers")
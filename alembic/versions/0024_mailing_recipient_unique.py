@@ -0,0 +1,56 @@
+"""unique mailing recipients and resumable enqueue
+
+Revision ID: 0024_recipient_unique
+Revises: 0023_dead_peers
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+from sqlalchemy.dialects import mysql
+
+
+revision = "0024_recipient_unique"
+down_revision = "0023_dead_peers"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Without an index on the pair the self-join below walks every row of the
+    # mailing for every row of the mailing.
+    op.create_index("tmp_mailing_recipients_mailing_user", "mailing_recipients", ["mailing_id", "user_id"])
+    # Keep the first row of every (mailing_id, user_id) pair; later copies are
+    # the duplicate sends the unique index is meant to prevent.
+    op.execute(
+        text(
+            "DELETE r FROM mailing_recipients r "
+            "JOIN mailing_recipients first ON first.mailing_id = r.mailing_id "
+            "AND first.user_id = r.user_id AND first.id < r.id"
+        )
+    )
+    op.create_index(
+        "ux_mailing_recipients_mailing_user",
+        "mailing_recipients",
+        ["mailing_id", "user_id"],
+        unique=True,
+    )
+    op.drop_index("tmp_mailing_recipients_mailing_user", table_name="mailing_recipients")
+
+    op.add_column("mailings", sa.Column("enqueued_at", sa.DateTime(), nullable=True))
+    op.add_column(
+        "mailings",
+        sa.Column("pending_target_ids", sa.Text().with_variant(mysql.LONGTEXT(), "mysql"), nullable=True),
+    )
+    op.add_column("mailings", sa.Column("duplicate_count", sa.Integer(), nullable=False, server_default="0"))
+    op.alter_column("mailings", "duplicate_count", server_default=None, existing_type=sa.Integer(), existing_nullable=False)
+    # Existing mailings were enqueued in one transaction.
+    op.execute(text("UPDATE mailings SET enqueued_at = created_at"))
+
+
+def downgrade() -> None:
+    op.drop_column("mailings", "duplicate_count")
+    op.drop_column("mailings", "pending_target_ids")
+    op.drop_column("mailings", "enqueued_at")
+    op.drop_index("ux_mailing_recipients_mailing_user", table_name="mailing_recipients")
@@ -0,0 +1,43 @@
+"""per-mailing recipient counters
+
+Revision ID: 0025_mailing_counters
+Revises: 0024_recipient_unique
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+
+revision = "0025_mailing_counters"
+down_revision = "0024_recipient_unique"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "mailing_counters",
+        sa.Column("mailing_id", sa.Integer(), sa.ForeignKey("mailings.id"), primary_key=True),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("sent", sa.Integer(), nullable=False),
+        sa.Column("failed", sa.Integer(), nullable=False),
+        sa.Column("pending", sa.Integer(), nullable=False),
+    )
+    # One pass over mailing_recipients; mailings without recipients get zeros.
+    op.execute(
+        text(
+            "INSERT INTO mailing_counters (mailing_id, total, sent, failed, pending) "
+            "SELECT m.id, COUNT(r.id), "
+            "COALESCE(SUM(r.status = 'sent'), 0), "
+            "COALESCE(SUM(r.status = 'failed'), 0), "
+            "COALESCE(SUM(r.status = 'pending'), 0) "
+            "FROM mailings m LEFT JOIN mailing_recipients r ON r.mailing_id = m.id "
+            "GROUP BY m.id"
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("mailing_counters")
@@ -0,0 +1,29 @@
+"""expiry of billing holds
+
+Revision ID: 0026_hold_expiry
+Revises: 0025_mailing_counters
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0026_hold_expiry"
+down_revision = "0025_mailing_counters"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("balance_transactions", sa.Column("expires_at", sa.DateTime(), nullable=True))
+    op.create_index(
+        "ix_balance_transactions_type_expires",
+        "balance_transactions",
+        ["tx_type", "expires_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_balance_transactions_type_expires", table_name="balance_transactions")
+    op.drop_column("balance_transactions", "expires_at")
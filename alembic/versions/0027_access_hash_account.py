@@ -0,0 +1,29 @@
+"""account that owns each stored access hash
+
+Revision ID: 0027_access_hash_account
+Revises: 0026_hold_expiry
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0027_access_hash_account"
+down_revision = "0026_hold_expiry"
+branch_labels = None
+depends_on = None
+
+
+_TABLES = ("parsed_users", "parsed_chats", "mailing_recipients")
+
+
+def upgrade() -> None:
+    # Existing hashes stay untagged (NULL): their account is unknown.
+    for table in _TABLES:
+        op.add_column(table, sa.Column("access_hash_account_id", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    for table in _TABLES:
+        op.drop_column(table, "access_hash_account_id")
@@ -9,7 +9,7 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import CallbackQuery, FSInputFile, Message
 import json
-from sqlalchemy import func, select
+from sqlalchemy import select
 from telethon import errors as telethon_errors
 from telethon.errors.rpcerrorlist import AuthKeyUnregisteredError
 
@@ -45,6 +45,7 @@ from app.services.auth import AccountService
 from app.services.billing import BillingService
 from app.services.mailing.logs import get_mailing_log_path
 from app.services.mailing.service import MailingService
+from app.services.mailing.stickers import get_sticker_set_cache
 from app.services.parser import ParserService
 from app.services.settings import get_setting, set_setting
 from typing import Optional, Dict
@@ -202,6 +203,8 @@ async def _finalize_mailing_with_content(message: Message, state: FSMContext, co
             repeat_count=repeat_count,
         )
     await message.answer(t("mailing_created", locale).format(id=mailing.id))
+    if mailing.duplicate_count:
+        await message.answer(t("mailing_duplicates_skipped", locale).format(count=mailing.duplicate_count))
     await message.answer(t("mailing_created_hint_tasks", locale))
     await state.clear()
 
@@ -238,6 +241,22 @@ async def _list_accounts(user_id: int):
     return accounts
 
 
+async def _find_sticker_index(message: Message, sticker_set_name: str) -> Optional[int]:
+    cache = get_sticker_set_cache()
+
+    async def load() -> list:
+        sticker_set = await message.bot.get_sticker_set(sticker_set_name)
+        return [sticker.file_unique_id for sticker in sticker_set.stickers]
+
+    unique_id = message.sticker.file_unique_id
+    unique_ids = cache.get("bot", sticker_set_name)
+    if unique_ids is None or unique_id not in unique_ids:
+        # Missing or cached before the pack changed.
+        unique_ids = await load()
+        cache.put("bot", sticker_set_name, unique_ids)
+    return unique_ids.index(unique_id) if unique_id in unique_ids else None
+
+
 async def _extract_mailing_content(message: Message):
     settings = get_settings()
     media_path = None
@@ -277,11 +296,7 @@ async def _extract_mailing_content(message: Message):
         sticker_set_name = message.sticker.set_name
         if sticker_set_name:
             try:
-                sticker_set = await message.bot.get_sticker_set(sticker_set_name)
-                for idx, sticker in enumerate(sticker_set.stickers):
-                    if sticker.file_id == media_file_id:
-                        sticker_set_index = idx
-                        break
+                sticker_set_index = await _find_sticker_index(message, sticker_set_name)
             except Exception:
                 sticker_set_name = None
                 sticker_set_index = None
@@ -1336,6 +1351,7 @@ async def mailing_details_cb(callback: CallbackQuery) -> None:
             await callback.answer()
             return
         stats = await service.get_stats(callback.from_user.id, mailing_id)
+        pace = await service.get_send_delay(mailing)
     source = mailing.target_source.value
     mention = "yes" if mailing.mention else "no"
     try:
@@ -1347,6 +1363,7 @@ async def mailing_details_cb(callback: CallbackQuery) -> None:
                 message_type=mailing.message_type.value,
                 mention=mention,
                 delay=mailing.delay_seconds,
+                pace=round(pace, 2),
                 repeat_count=mailing.repeat_count,
                 limit=mailing.limit_count,
                 total=stats["total"],
@@ -1384,10 +1401,7 @@ async def mailing_details_recipients_cb(callback: CallbackQuery) -> None:
             await edit_with_history(callback.message, t("mailing_not_found", locale), reply_markup=back_to_menu_keyboard(locale))
             await callback.answer()
             return
-        result = await session.execute(
-            select(func.count(MailingRecipient.id)).where(MailingRecipient.mailing_id == mailing_id)
-        )
-        total = int(result.scalar() or 0)
+        total = (await service.get_stats(callback.from_user.id, mailing_id))["total"]
         total_pages = max((total + RECIPIENTS_PAGE_SIZE - 1) // RECIPIENTS_PAGE_SIZE, 1)
         page = max(1, min(page, total_pages))
         offset = (page - 1) * RECIPIENTS_PAGE_SIZE
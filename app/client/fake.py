@@ -0,0 +1,210 @@
+"""In-memory stand-in for ``TelegramClient`` used by the offline simulator.
+
+Implements the subset of the Telethon API that ``MailingRunner`` and
+``ParserService`` call. Every account gets its own seeded ``random.Random`` so
+a run with the same config injects the same failures in the same order.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, List, Optional
+
+from telethon.errors import FloodWaitError, PeerFloodError, UserPrivacyRestrictedError
+from telethon.sessions import StringSession
+from telethon.tl.functions.messages import GetStickerSetRequest
+from telethon.tl.types import (
+    Channel,
+    ChatPhotoEmpty,
+    InputPeerUser,
+    User,
+    UserStatusLastWeek,
+    UserStatusOnline,
+    UserStatusRecently,
+)
+
+
+# Generated users get ids above this offset so they never collide with real ones.
+FAKE_USER_ID_BASE = 7_000_000_000
+
+
+@dataclass
+class FakeTelegramConfig:
+    # Seconds per request: latency plus a uniform jitter in [0, latency_jitter].
+    latency: float = 0.05
+    latency_jitter: float = 0.0
+    # Raise FloodWaitError(flood_wait_seconds) on every Nth send; 0 disables.
+    flood_wait_every: int = 0
+    flood_wait_seconds: int = 5
+    # Raise PeerFloodError on every Nth send; 0 disables.
+    peer_flood_every: int = 0
+    # Share of get_input_entity calls that fail with ValueError.
+    resolve_failure_rate: float = 0.0
+    # Share of sends rejected with UserPrivacyRestrictedError.
+    privacy_error_rate: float = 0.0
+    participants: int = 1000
+    messages: int = 1000
+    dialogs: int = 10
+    sticker_set_size: int = 5
+    seed: int = 0
+
+
+def fake_user_id(index: int) -> int:
+    return FAKE_USER_ID_BASE + index
+
+
+def fake_access_hash(user_id: int) -> int:
+    return (user_id * 2654435761) % (2 ** 63)
+
+
+def _fake_user(index: int, rng: random.Random) -> User:
+    user_id = fake_user_id(index)
+    status = rng.choice((UserStatusOnline(expires=datetime.now(timezone.utc)), UserStatusRecently(), UserStatusLastWeek()))
+    return User(
+        id=user_id,
+        access_hash=fake_access_hash(user_id),
+        first_name=f"User{index}",
+        username=f"fake_user_{index}",
+        status=status,
+    )
+
+
+class FakeTelegramClient:
+    def __init__(self, account_id: int, config: Optional[FakeTelegramConfig] = None) -> None:
+        self.account_id = account_id
+        self.config = config or FakeTelegramConfig()
+        self.session = StringSession()
+        self.sent: int = 0
+        self.send_attempts: int = 0
+        self.flood_waits: int = 0
+        self.resolve_failures: int = 0
+        self._rng = random.Random(self.config.seed * 1_000_003 + account_id)
+        self._connected = False
+
+    async def _latency(self) -> None:
+        delay = self.config.latency
+        if self.config.latency_jitter:
+            delay += self._rng.uniform(0, self.config.latency_jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def connect(self) -> None:
+        self._connected = True
+
+    async def disconnect(self) -> None:
+        self._connected = False
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def is_user_authorized(self) -> bool:
+        return True
+
+    async def get_me(self) -> User:
+        return User(id=self.account_id, is_self=True, first_name=f"Account{self.account_id}")
+
+    async def _deliver(self, target) -> SimpleNamespace:
+        await self._latency()
+        self.send_attempts += 1
+        config = self.config
+        if config.flood_wait_every and self.send_attempts % config.flood_wait_every == 0:
+            self.flood_waits += 1
+            raise FloodWaitError(request=None, capture=config.flood_wait_seconds)
+        if config.peer_flood_every and self.send_attempts % config.peer_flood_every == 0:
+            raise PeerFloodError(request=None)
+        if config.privacy_error_rate and self._rng.random() < config.privacy_error_rate:
+            raise UserPrivacyRestrictedError(request=None)
+        self.sent += 1
+        return SimpleNamespace(id=self.sent, peer=target, media=None)
+
+    async def send_message(self, entity, message: str = "", **kwargs) -> SimpleNamespace:
+        return await self._deliver(entity)
+
+    async def send_file(self, entity, file, **kwargs) -> SimpleNamespace:
+        result = await self._deliver(entity)
+        result.media = SimpleNamespace(file=file)
+        return result
+
+    async def get_input_entity(self, peer) -> InputPeerUser:
+        await self._latency()
+        if self.config.resolve_failure_rate and self._rng.random() < self.config.resolve_failure_rate:
+            self.resolve_failures += 1
+            raise ValueError(f"Cannot find any entity corresponding to {peer!r}")
+        if isinstance(peer, InputPeerUser):
+            return peer
+        if isinstance(peer, str):
+            # Usernames seeded by the simulator map back to their own user id.
+            prefix, _, number = peer.lstrip("@").rpartition("_")
+            if prefix == "fake_user" and number.isdigit():
+                user_id = fake_user_id(int(number))
+            else:
+                user_id = fake_user_id(zlib.crc32(peer.encode()))
+        else:
+            user_id = int(getattr(peer, "user_id", peer))
+        return InputPeerUser(user_id=user_id, access_hash=fake_access_hash(user_id))
+
+    async def get_entity(self, peer) -> User:
+        await self._latency()
+        user_id = int(peer)
+        return _fake_user(user_id - FAKE_USER_ID_BASE, self._rng)
+
+    async def get_entities(self, peers) -> List[User]:
+        await self._latency()
+        return [_fake_user(int(peer) - FAKE_USER_ID_BASE, self._rng) for peer in peers]
+
+    async def iter_participants(self, chat, limit: Optional[int] = None, **kwargs) -> AsyncIterator[User]:
+        total = self.config.participants if limit is None else min(limit, self.config.participants)
+        for index in range(total):
+            # Telegram pages participants 200 at a time.
+            if index % 200 == 0:
+                await self._latency()
+            yield _fake_user(index, self._rng)
+
+    async def get_participants(self, chat, filter=None, limit: Optional[int] = None, **kwargs) -> List[User]:
+        await self._latency()
+        total = min(limit or 5, self.config.participants)
+        return [_fake_user(index, self._rng) for index in range(total)]
+
+    async def iter_messages(self, chat, limit: Optional[int] = None, **kwargs) -> AsyncIterator[SimpleNamespace]:
+        total = self.config.messages if limit is None else min(limit, self.config.messages)
+        participants = max(1, self.config.participants)
+        for index in range(total):
+            if index % 100 == 0:
+                await self._latency()
+            yield SimpleNamespace(
+                id=index + 1,
+                sender_id=fake_user_id(self._rng.randrange(participants)),
+                entities=None,
+                reply_to=None,
+            )
+
+    async def get_messages(self, chat, ids=None, **kwargs) -> SimpleNamespace:
+        await self._latency()
+        return SimpleNamespace(id=ids, sender_id=fake_user_id(self._rng.randrange(max(1, self.config.participants))))
+
+    async def iter_dialogs(self, **kwargs) -> AsyncIterator[SimpleNamespace]:
+        await self._latency()
+        for index in range(self.config.dialogs):
+            entity = Channel(
+                id=FAKE_USER_ID_BASE + index,
+                title=f"Fake group {index}",
+                photo=ChatPhotoEmpty(),
+                date=datetime.now(timezone.utc),
+                megagroup=True,
+                access_hash=fake_access_hash(FAKE_USER_ID_BASE + index),
+                username=f"fake_group_{index}",
+            )
+            yield SimpleNamespace(entity=entity)
+
+    async def __call__(self, request) -> Any:
+        await self._latency()
+        if isinstance(request, GetStickerSetRequest):
+            return SimpleNamespace(
+                documents=[SimpleNamespace(id=index) for index in range(self.config.sticker_set_size)]
+            )
+        raise NotImplementedError(f"FakeTelegramClient does not implement {type(request).__name__}")
@@ -1,17 +1,35 @@
 from __future__ import annotations
 
-from typing import Dict
+import weakref
+from typing import Callable, Dict, Optional
 
 from telethon import TelegramClient
 from telethon.sessions import StringSession
 
 from app.core.config import get_settings
+from app.core.metrics import telethon_active_clients
 from app.db.models import Account
 
 
+_managers: "weakref.WeakSet[TelethonManager]" = weakref.WeakSet()
+
+
+def _count_active_clients() -> Dict[tuple, float]:
+    active = sum(
+        1 for manager in list(_managers) for client in list(manager._clients.values()) if client.is_connected()
+    )
+    return {(): active}
+
+
+telethon_active_clients.set_callback(_count_active_clients)
+
+
 class TelethonManager:
-    def __init__(self) -> None:
+    def __init__(self, client_factory: Optional[Callable[[Account], TelegramClient]] = None) -> None:
+        # client_factory replaces TelegramClient, e.g. with FakeTelegramClient for offline runs.
+        self._client_factory = client_factory
         self._clients: Dict[int, TelegramClient] = {}
+        _managers.add(self)
 
     async def get_client(self, account: Account) -> TelegramClient:
         if account.id in self._clients:
@@ -20,8 +38,11 @@ class TelethonManager:
                 await client.connect()
             return client
 
-        settings = get_settings()
-        client = TelegramClient(StringSession(account.session_string), settings.api_id, settings.api_hash)
+        if self._client_factory is not None:
+            client = self._client_factory(account)
+        else:
+            settings = get_settings()
+            client = TelegramClient(StringSession(account.session_string), settings.api_id, settings.api_hash)
         await client.connect()
         self._clients[account.id] = client
         return client
@@ -23,10 +23,45 @@ class Settings(BaseSettings):
 
     mailing_batch_size: int = 30
     mailing_delay_seconds: float = 1.2
+    mailing_flush_size: int = 50
+    mailing_flush_interval_ms: int = 2000
+    mailing_status_check_seconds: float = 5.0
+    mailing_probe_seconds: float = 5.0
+    mailing_reconcile_seconds: float = 60.0
+    mailing_memory_log_seconds: float = 600.0
+    billing_price_cache_seconds: float = 60.0
+    mailing_lease_seconds: float = 120.0
+    mailing_runner_id: Optional[str] = None
+    mailing_prefetch_size: int = 20
+    mailing_resolve_ahead: int = 5
+    # Fraction of the learned interval dropped after each successful send.
+    mailing_pacing_decay: float = 0.01
+    mailing_pacing_backoff: float = 2.0
+    mailing_pacing_max_seconds: float = 300.0
+    mailing_peer_flood_park_seconds: float = 600.0
+    mailing_account_error_park_seconds: float = 3600.0
+    mailing_max_retries: int = 3
+    mailing_retry_backoff_seconds: float = 30.0
+    mailing_retry_backoff_max_seconds: float = 3600.0
+    mailing_dead_peer_ttl_days: float = 30.0
+    dead_peer_cache_size: int = 100000
+    # In-memory only: how long a peer one account failed to reach is skipped by that account.
+    mailing_unreachable_peer_ttl_seconds: float = 3600.0
+    # Set to false when sending runs in separate `python -m app.worker` processes.
+    mailing_sending_enabled: bool = True
+    mailing_worker_shards: int = 1
+
+    sticker_cache_size: int = 256
+    sticker_cache_ttl_seconds: float = 3600.0
+    peer_cache_size: int = 100000
 
     web_auth_host: str = "127.0.0.1"
     web_auth_port: int = 8080
     web_auth_base_url: str = "http://127.0.0.1:8080"
+    # The bot process serves /metrics on the web auth server. Worker shards
+    # listen on metrics_port + shard index when this is set.
+    metrics_host: str = "127.0.0.1"
+    metrics_port: Optional[int] = None
 
     telethon_log_level: Optional[str] = None
 
@@ -0,0 +1,25 @@
+import gc
+import os
+import sys
+from typing import Dict
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process; peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def memory_snapshot() -> Dict[str, int]:
+    return {"gc_objects": len(gc.get_objects()), "rss_bytes": rss_bytes()}
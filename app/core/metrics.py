@@ -0,0 +1,282 @@
+"""In-process metrics registry rendered in the Prometheus text exposition format.
+
+Metrics are updated from the asyncio thread and rendered from the HTTP server
+thread, so every metric guards its values with a lock. Each process (bot or
+``python -m app.worker`` shard) exposes its own registry.
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.memory import memory_snapshot
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = self._header()
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge set directly or computed on scrape by a callback.
+
+    The callback returns ``{label values: value}`` so one callback can report
+    every label combination of the gauge.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def set(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_callback(self, callback: Optional[Callable[[], Dict[LabelValues, float]]]) -> None:
+        self._callback = callback
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self._callback is not None:
+            try:
+                values.update(self._callback())
+            except Exception:
+                # A broken callback must not take the whole scrape down.
+                pass
+        lines = self._header()
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self._buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            counts = {key: list(values) for key, values in self._counts.items()}
+            sums = dict(self._sums)
+        lines = self._header()
+        for key in sorted(counts):
+            cumulative = 0
+            for bound, count in zip(self._buckets + (float("inf"),), counts[key]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(sums[key])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+messages_sent = registry.counter(
+    "mailing_messages_sent_total",
+    "Messages delivered by the mailing runner.",
+    ("message_type",),
+)
+messages_failed = registry.counter(
+    "mailing_messages_failed_total",
+    "Recipients the mailing runner gave up on or retried, by error class.",
+    ("message_type", "error_class"),
+)
+send_latency = registry.histogram(
+    "mailing_send_latency_seconds",
+    "Duration of one send request to Telegram.",
+    ("message_type",),
+)
+flood_wait_seconds = registry.counter(
+    "telegram_flood_wait_seconds_total",
+    "Seconds of FloodWaitError imposed on each account.",
+    ("account_id",),
+)
+pipeline_queue_depth = registry.gauge(
+    "mailing_pipeline_queue_depth",
+    "Items waiting in the runner pipeline queues, summed over running mailings.",
+    ("queue",),
+)
+db_commit_latency = registry.histogram(
+    "db_commit_latency_seconds",
+    "Duration of database commits on the mailing hot path.",
+    ("operation",),
+)
+parser_users = registry.counter(
+    "parser_users_added_total",
+    "Users and chats stored by the parser; rate() gives users per second.",
+    ("method",),
+)
+parser_run_seconds = registry.histogram(
+    "parser_run_seconds",
+    "Duration of one parser run.",
+    ("method",),
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0),
+)
+telethon_active_clients = registry.gauge(
+    "telethon_active_clients",
+    "Connected Telethon clients held by this process.",
+)
+process_memory = registry.gauge(
+    "process_memory",
+    "Resident memory in bytes (kind=rss_bytes) and live gc objects (kind=gc_objects).",
+    ("kind",),
+)
+process_memory.set_callback(lambda: {(kind,): value for kind, value in memory_snapshot().items()})
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        send_metrics(self)
+
+    def log_message(self, format, *args):
+        return
+
+
+def send_metrics(handler: BaseHTTPRequestHandler) -> None:
+    body = registry.render().encode("utf-8")
+    handler.send_response(200)
+    handler.send_header("Content-Type", CONTENT_TYPE)
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+class MetricsServer:
+    """Standalone ``/metrics`` endpoint for processes without a WebAuthServer."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self._server = HTTPServer((host, port), _MetricsHandler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
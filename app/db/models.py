@@ -4,7 +4,8 @@ import enum
 from datetime import datetime
 from typing import List, Optional
 
-from sqlalchemy import BigInteger, Boolean, DateTime, Enum, ForeignKey, Integer, String, Text, UniqueConstraint
+from sqlalchemy import BigInteger, Boolean, DateTime, Enum, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.dialects.mysql import LONGTEXT
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -48,6 +49,8 @@ class Account(Base):
     phone: Mapped[str] = mapped_column(String(32), unique=True)
     session_string: Mapped[str] = mapped_column(Text)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Learned minimum pause between messages, see AccountPacer.
+    send_interval_seconds: Mapped[Optional[float]] = mapped_column()
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     mailings: Mapped[List["Mailing"]] = relationship(back_populates="account")
@@ -87,12 +90,15 @@ class PriceConfig(Base):
 
 class BalanceTransaction(Base):
     __tablename__ = "balance_transactions"
+    __table_args__ = (Index("ix_balance_transactions_type_expires", "tx_type", "expires_at"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(BigInteger, index=True)
     amount: Mapped[float] = mapped_column()
     tx_type: Mapped[str] = mapped_column(String(32))
     reason: Mapped[Optional[str]] = mapped_column(String(128))
+    # Set on "reserve" holds: after this the hold is released by the sweep.
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
@@ -107,6 +113,8 @@ class ParsedUser(Base):
     first_name: Mapped[Optional[str]] = mapped_column(String(64))
     last_name: Mapped[Optional[str]] = mapped_column(String(64))
     access_hash: Mapped[Optional[int]] = mapped_column(BigInteger)
+    # Account the access hash belongs to; NULL for hashes stored before it was tracked.
+    access_hash_account_id: Mapped[Optional[int]] = mapped_column(Integer)
     source: Mapped[Optional[str]] = mapped_column(String(128))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
@@ -122,6 +130,7 @@ class ParsedChat(Base):
     username: Mapped[Optional[str]] = mapped_column(String(64))
     chat_type: Mapped[Optional[str]] = mapped_column(String(32))
     access_hash: Mapped[Optional[int]] = mapped_column(BigInteger)
+    access_hash_account_id: Mapped[Optional[int]] = mapped_column(Integer)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
@@ -179,6 +188,13 @@ class Mailing(Base):
     repeat_delay_seconds: Mapped[float] = mapped_column(default=0.0)
     repeat_count: Mapped[int] = mapped_column(default=1)
 
+    # NULL until every recipient is enqueued; explicit target ids are kept in
+    # pending_target_ids until then so an interrupted enqueue can be resumed.
+    enqueued_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    pending_target_ids: Mapped[Optional[str]] = mapped_column(Text().with_variant(LONGTEXT(), "mysql"))
+    # Target ids dropped at enqueue because the same recipient was already in the mailing.
+    duplicate_count: Mapped[int] = mapped_column(Integer, default=0)
+
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -188,15 +204,65 @@ class Mailing(Base):
 
 class MailingRecipient(Base):
     __tablename__ = "mailing_recipients"
+    __table_args__ = (
+        Index("ix_mailing_recipients_mailing_status_id", "mailing_id", "status", "id"),
+        UniqueConstraint("mailing_id", "user_id", name="ux_mailing_recipients_mailing_user"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     mailing_id: Mapped[int] = mapped_column(ForeignKey("mailings.id"))
     user_id: Mapped[int] = mapped_column(BigInteger)
     username: Mapped[Optional[str]] = mapped_column(String(64))
     access_hash: Mapped[Optional[int]] = mapped_column(BigInteger)
+    access_hash_account_id: Mapped[Optional[int]] = mapped_column(Integer)
 
     status: Mapped[RecipientStatus] = mapped_column(Enum(RecipientStatus), default=RecipientStatus.pending)
     sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
     error: Mapped[Optional[str]] = mapped_column(Text)
+    leased_by: Mapped[Optional[str]] = mapped_column(String(64))
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    # Sends done so far for repeat_count mailings and transient failures so far;
+    # the next attempt of either kind is due at next_attempt_at.
+    attempt_round: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    retry_count: Mapped[int] = mapped_column(Integer, default=0)
 
     mailing: Mapped[Mailing] = relationship(back_populates="recipients")
+
+
+class MailingCounter(Base):
+    """Recipient totals per status, kept up to date by enqueue and the runner's status flushes."""
+
+    __tablename__ = "mailing_counters"
+
+    mailing_id: Mapped[int] = mapped_column(ForeignKey("mailings.id"), primary_key=True)
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    pending: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class ResolvedPeer(Base):
+    __tablename__ = "resolved_peers"
+    __table_args__ = (UniqueConstraint("account_id", "peer_key", name="ux_resolved_peers_account_key"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    account_id: Mapped[int] = mapped_column(Integer)
+    peer_key: Mapped[str] = mapped_column(String(80))
+    peer_type: Mapped[str] = mapped_column(String(16))
+    peer_id: Mapped[int] = mapped_column(BigInteger)
+    access_hash: Mapped[Optional[int]] = mapped_column(BigInteger)
+    resolved_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class DeadPeer(Base):
+    __tablename__ = "dead_peers"
+    __table_args__ = (UniqueConstraint("owner_id", "peer_kind", "peer_id", name="ux_dead_peers_owner_peer"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    owner_id: Mapped[int] = mapped_column(BigInteger)
+    peer_kind: Mapped[str] = mapped_column(String(8))
+    peer_id: Mapped[int] = mapped_column(BigInteger)
+    reason: Mapped[str] = mapped_column(String(255))
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -202,6 +202,7 @@ STRINGS = {
     "disabled": "🔴 Выключено",
     "mailing_content": "Пришли текст или медиа (фото/видео/стикер/документ/voice/audio) с подписью.",
     "mailing_created": "Рассылка создана, id={id}",
+    "mailing_duplicates_skipped": "Пропущено дубликатов получателей: {count}. Каждый получит сообщение только один раз.",
     "mailing_paused": "Рассылка остановлена.",
     "mailing_resumed": "Рассылка возобновлена.",
     "mailing_status": "Статус: {status}",
@@ -209,7 +210,7 @@ STRINGS = {
     "tasks_empty": "📚 Ваши активные задачи\n━━━━━━━━━━━━━━━━━━\n\n📭 Активных задач нет.\nВы можете создать новую из разделов «⚡ Рассылка».",
     "mailing_actions": "Действия для рассылки #{id}",
     "mailing_repeated": "Рассылка повторена, id={id}",
-    "mailing_details": "📨 <b>Рассылка #{id}</b>\n\n<b>Статус:</b> <i>{status}</i>\n<b>Источник:</b> <i>{source}</i>\n<b>Тип:</b> <i>{message_type}</i>\n<b>Упоминания:</b> <i>{mention}</i>\n<b>Задержка:</b> <i>{delay}s</i>\n<b>Раунды:</b> <i>{repeat_count}</i>\n<b>Лимит получателей:</b> <i>{limit}</i>\n\n📊 <b>Статистика</b>\n<b>Всего:</b> {total}\n<b>Отправлено:</b> {sent}\n<b>Ошибок:</b> {failed}\n<b>Ожидает:</b> {pending}",
+    "mailing_details": "📨 <b>Рассылка #{id}</b>\n\n<b>Статус:</b> <i>{status}</i>\n<b>Источник:</b> <i>{source}</i>\n<b>Тип:</b> <i>{message_type}</i>\n<b>Упоминания:</b> <i>{mention}</i>\n<b>Задержка:</b> <i>{delay}s</i>\n<b>Темп отправки:</b> <i>{pace}s</i>\n<b>Раунды:</b> <i>{repeat_count}</i>\n<b>Лимит получателей:</b> <i>{limit}</i>\n\n📊 <b>Статистика</b>\n<b>Всего:</b> {total}\n<b>Отправлено:</b> {sent}\n<b>Ошибок:</b> {failed}\n<b>Ожидает:</b> {pending}",
     "mailing_recipients_title": "Получатели ({page}/{pages})\nВсего: {total}",
     "mailing_recipients_empty": "Список получателей пуст.",
     "mailing_message_info": "Сообщение #{id}\nТип: {message_type}",
@@ -202,6 +202,7 @@ STRINGS = {
     "disabled": "🔴 Вимкнено",
     "mailing_content": "Надішли текст або медіа (фото/відео/стікер/документ/voice/audio) з підписом.",
     "mailing_created": "Розсилку створено, id={id}",
+    "mailing_duplicates_skipped": "Пропущено дублікатів отримувачів: {count}. Кожен отримає повідомлення лише один раз.",
     "mailing_paused": "Розсилку призупинено.",
     "mailing_resumed": "Розсилку відновлено.",
     "mailing_status": "Статус: {status}",
@@ -209,7 +210,7 @@ STRINGS = {
     "tasks_empty": "📚 Ваші активні задачі\n━━━━━━━━━━━━━━━━━━\n\n📭 Активних задач немає.\nВи можете створити нову з розділів «⚡ Розсилка».",
     "mailing_actions": "Дії для розсилки #{id}",
     "mailing_repeated": "Розсилку повторено, id={id}",
-    "mailing_details": "📨 <b>Розсилка #{id}</b>\n\n<b>Статус:</b> <i>{status}</i>\n<b>Джерело:</b> <i>{source}</i>\n<b>Тип:</b> <i>{message_type}</i>\n<b>Згадки:</b> <i>{mention}</i>\n<b>Затримка:</b> <i>{delay}s</i>\n<b>Раунди:</b> <i>{repeat_count}</i>\n<b>Ліміт отримувачів:</b> <i>{limit}</i>\n\n📊 <b>Статистика</b>\n<b>Усього:</b> {total}\n<b>Надіслано:</b> {sent}\n<b>Помилок:</b> {failed}\n<b>Очікує:</b> {pending}",
+    "mailing_details": "📨 <b>Розсилка #{id}</b>\n\n<b>Статус:</b> <i>{status}</i>\n<b>Джерело:</b> <i>{source}</i>\n<b>Тип:</b> <i>{message_type}</i>\n<b>Згадки:</b> <i>{mention}</i>\n<b>Затримка:</b> <i>{delay}s</i>\n<b>Темп відправки:</b> <i>{pace}s</i>\n<b>Раунди:</b> <i>{repeat_count}</i>\n<b>Ліміт отримувачів:</b> <i>{limit}</i>\n\n📊 <b>Статистика</b>\n<b>Усього:</b> {total}\n<b>Надіслано:</b> {sent}\n<b>Помилок:</b> {failed}\n<b>Очікує:</b> {pending}",
     "mailing_recipients_title": "Отримувачі ({page}/{pages})\nУсього: {total}",
     "mailing_recipients_empty": "Список отримувачів порожній.",
     "mailing_message_info": "Повідомлення #{id}\nТип: {message_type}",
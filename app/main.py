@@ -4,21 +4,13 @@ from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from app.bot.handlers import accounts, admin, mailing, user
-from app.client.telethon_manager import TelethonManager
 from app.core.config import get_settings
 from app.core.logger import setup_logging
 from app.db.init import init_db
 from app.db.session import get_engine, get_session_factory
-from app.services.mailing.runner import MailingRunner
+from app.services.mailing.service import MailingService
 from app.services.web_auth_server import WebAuthServer
-
-
-async def run_mailing_worker() -> None:
-    session_factory = get_session_factory()
-    manager = TelethonManager()
-    async with session_factory() as session:
-        runner = MailingRunner(session, manager)
-        await runner.run_forever()
+from app.worker import run_mailing_worker
 
 
 async def main() -> None:
@@ -26,6 +18,9 @@ async def main() -> None:
     settings = get_settings()
 
     await init_db(get_engine())
+    # Only the bot process enqueues, so anything unfinished at startup was interrupted.
+    async with get_session_factory()() as session:
+        await MailingService(session).resume_enqueues()
 
     web_server = WebAuthServer(settings.web_auth_host, settings.web_auth_port)
     web_server.start()
@@ -37,7 +32,8 @@ async def main() -> None:
     dp.include_router(admin.router)
     dp.include_router(mailing.router)
 
-    asyncio.create_task(run_mailing_worker())
+    if settings.mailing_sending_enabled:
+        asyncio.create_task(run_mailing_worker())
     await dp.start_polling(bot)
 
 
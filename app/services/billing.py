@@ -1,8 +1,10 @@
 from __future__ import annotations
 
-from typing import Optional, Tuple
+import math
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.models import BalanceTransaction, PriceConfig, UserBalance
@@ -57,6 +59,133 @@ class BillingService:
         await self._session.commit()
         return balance.balance
 
+    async def reserve(
+        self,
+        user_id: int,
+        amount: float,
+        unit: float,
+        reason: Optional[str] = None,
+        expires_at: Optional[datetime] = None,
+    ) -> Tuple[float, Optional[int]]:
+        """Hold up to ``amount`` (in whole ``unit`` steps) from the balance.
+
+        Returns the held amount and the id of the ledger row that records the
+        hold. Spent parts move to a charge row with :meth:`spend_reserved` and
+        the rest is given back by :meth:`settle`, or by
+        :meth:`release_expired_holds` once ``expires_at`` has passed.
+        """
+        if amount <= 0 or unit <= 0:
+            return 0.0, None
+        result = await self._session.execute(
+            update(UserBalance)
+            .where(UserBalance.user_id == user_id, UserBalance.balance >= amount)
+            .values(balance=UserBalance.balance - amount)
+        )
+        if not result.rowcount:
+            # Not enough for the whole amount: hold as many units as the balance covers.
+            # Column reads and a relative UPDATE: the session may hold a stale
+            # UserBalance object from an earlier chunk of the same turn.
+            result = await self._session.execute(
+                select(UserBalance.balance).where(UserBalance.user_id == user_id).with_for_update()
+            )
+            available = result.scalar()
+            units = math.floor(available / unit + 1e-9) if available is not None else 0
+            amount = min(amount, max(units, 0) * unit)
+            if amount <= 0:
+                await self._session.commit()
+                return 0.0, None
+            await self._session.execute(
+                update(UserBalance)
+                .where(UserBalance.user_id == user_id)
+                .values(balance=UserBalance.balance - amount)
+            )
+        tx = BalanceTransaction(
+            user_id=user_id, amount=-amount, tx_type="reserve", reason=reason, expires_at=expires_at
+        )
+        self._session.add(tx)
+        await self._session.flush()
+        await self._session.commit()
+        return amount, tx.id
+
+    async def spend_reserved(
+        self,
+        user_id: int,
+        tx_id: int,
+        charge_tx_id: Optional[int],
+        amount: float,
+        reason: Optional[str] = None,
+    ) -> int:
+        """Move ``amount`` out of a hold into its charge row, without committing.
+
+        The first call creates the charge row and later ones grow it; returns its
+        id. If the hold has already been released the amount is taken from the
+        balance instead.
+        """
+        result = await self._session.execute(
+            update(BalanceTransaction)
+            .where(BalanceTransaction.id == tx_id, BalanceTransaction.tx_type == "reserve")
+            .values(amount=BalanceTransaction.amount + amount)
+        )
+        if not result.rowcount:
+            await self._session.execute(
+                update(UserBalance)
+                .where(UserBalance.user_id == user_id)
+                .values(balance=UserBalance.balance - amount)
+            )
+        if charge_tx_id is None:
+            tx = BalanceTransaction(user_id=user_id, amount=-amount, tx_type="charge", reason=reason)
+            self._session.add(tx)
+            await self._session.flush()
+            return tx.id
+        await self._session.execute(
+            update(BalanceTransaction)
+            .where(BalanceTransaction.id == charge_tx_id)
+            .values(amount=BalanceTransaction.amount - amount)
+        )
+        return charge_tx_id
+
+    async def settle(self, user_id: int, tx_id: int) -> None:
+        """Give back what is left of a hold made by :meth:`reserve` and drop the hold."""
+        result = await self._session.execute(
+            select(BalanceTransaction.amount)
+            .where(BalanceTransaction.id == tx_id, BalanceTransaction.tx_type == "reserve")
+            .with_for_update()
+        )
+        remaining = result.scalar()
+        if remaining is not None:
+            if remaining < 0:
+                await self._session.execute(
+                    update(UserBalance)
+                    .where(UserBalance.user_id == user_id)
+                    .values(balance=UserBalance.balance - remaining)
+                )
+            await self._session.execute(delete(BalanceTransaction).where(BalanceTransaction.id == tx_id))
+        await self._session.commit()
+
+    async def has_holds(self, user_id: int, exclude: Iterable[int] = ()) -> bool:
+        """Whether ``user_id`` has open holds other than the ledger rows in ``exclude``."""
+        query = select(BalanceTransaction.id).where(
+            BalanceTransaction.user_id == user_id, BalanceTransaction.tx_type == "reserve"
+        )
+        exclude = list(exclude)
+        if exclude:
+            query = query.where(BalanceTransaction.id.not_in(exclude))
+        result = await self._session.execute(query.limit(1))
+        return result.first() is not None
+
+    async def release_expired_holds(self, now: Optional[datetime] = None) -> int:
+        """Settle holds whose process died before it could; returns how many there were."""
+        result = await self._session.execute(
+            select(BalanceTransaction.id, BalanceTransaction.user_id).where(
+                BalanceTransaction.tx_type == "reserve",
+                BalanceTransaction.expires_at < (now or datetime.utcnow()),
+            )
+        )
+        holds = result.all()
+        for tx_id, user_id in holds:
+            await self.settle(user_id, tx_id)
+        return len(holds)
+
     async def set_price(self, key: str, price: float) -> float:
         result = await self._session.execute(select(PriceConfig).where(PriceConfig.key == key))
         row = result.scalars().first()
@@ -73,6 +202,13 @@ class BillingService:
         row = result.scalars().first()
         return row.price if row else 0.0
 
+    async def get_message_price(self, mention: bool) -> float:
+        """Price of one mailing message, with the mention surcharge when ``mention`` is set."""
+        price = await self.get_price("mailing_message")
+        if mention:
+            price += await self.get_price("mailing_message_mention")
+        return price
+
     async def list_prices(self) -> list[PriceConfig]:
         result = await self._session.execute(select(PriceConfig))
         return result.scalars().all()
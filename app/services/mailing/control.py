@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, Optional
+
+
+class MailingControl:
+    """In-process pause/stop signals for running mailings.
+
+    MailingService halts a mailing when it is paused or deleted and releases it
+    on resume. The runner checks the flag between recipients and waits on it
+    instead of sleeping, so a pause interrupts the inter-message delay.
+    Changes made by other processes are picked up by the runner's periodic
+    status check.
+
+    It also carries a wakeup signal: creating or resuming a mailing wakes the
+    runner's scheduler instead of waiting for its next reconciliation. The
+    runner itself sends ``reconcile=False`` wakeups when it schedules an earlier
+    due time, which only recompute the sleep.
+    """
+
+    def __init__(self) -> None:
+        self._halted: Dict[int, asyncio.Event] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._reconcile = False
+
+    def _event(self, mailing_id: int) -> asyncio.Event:
+        event = self._halted.get(mailing_id)
+        if event is None:
+            event = asyncio.Event()
+            self._halted[mailing_id] = event
+        return event
+
+    def halt(self, mailing_id: int) -> None:
+        self._event(mailing_id).set()
+
+    def release(self, mailing_id: int) -> None:
+        event = self._halted.get(mailing_id)
+        if event is not None:
+            event.clear()
+
+    def forget(self, mailing_id: int) -> None:
+        self._halted.pop(mailing_id, None)
+
+    def is_halted(self, mailing_id: int) -> bool:
+        event = self._halted.get(mailing_id)
+        return event is not None and event.is_set()
+
+    async def sleep(self, mailing_id: int, seconds: float) -> bool:
+        """Sleep up to ``seconds``; return True as soon as the mailing is halted."""
+        event = self._event(mailing_id)
+        if event.is_set():
+            return True
+        if seconds <= 0:
+            return False
+        try:
+            await asyncio.wait_for(event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def notify(self, reconcile: bool = True) -> None:
+        self._reconcile = self._reconcile or reconcile
+        self._wakeup_event().set()
+
+    async def wait_for_wakeup(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for :meth:`notify`; return True if a reconcile was requested."""
+        event = self._wakeup_event()
+        if not event.is_set():
+            try:
+                await asyncio.wait_for(event.wait(), timeout=max(0.0, timeout))
+            except asyncio.TimeoutError:
+                return False
+        event.clear()
+        reconcile, self._reconcile = self._reconcile, False
+        return reconcile
+
+    def _wakeup_event(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+
+mailing_control = MailingControl()
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from typing import Dict
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import MailingCounter, MailingRecipient, RecipientStatus
+
+
+async def add_to_counters(session: AsyncSession, mailing_id: int, **deltas: int) -> None:
+    """Shift counter columns by the given amounts in the caller's transaction."""
+    values = {name: getattr(MailingCounter, name) + delta for name, delta in deltas.items() if delta}
+    if values:
+        await session.execute(update(MailingCounter).where(MailingCounter.mailing_id == mailing_id).values(**values))
+
+
+async def recount(session: AsyncSession, mailing_id: int) -> None:
+    """Rebuild the counters of one mailing from its recipient rows.
+
+    The recipient rows are read FOR UPDATE before the counter row is touched,
+    the same order as the runner's status flushes, so a concurrent flush either
+    lands in this count or applies its delta on top of it.
+    """
+    result = await session.execute(
+        select(MailingRecipient.status, func.count(MailingRecipient.id))
+        .where(MailingRecipient.mailing_id == mailing_id)
+        .group_by(MailingRecipient.status)
+        .with_for_update()
+    )
+    by_status: Dict[RecipientStatus, int] = {status: int(count) for status, count in result.all()}
+    values = {
+        "total": sum(by_status.values()),
+        "sent": by_status.get(RecipientStatus.sent, 0),
+        "failed": by_status.get(RecipientStatus.failed, 0),
+        "pending": by_status.get(RecipientStatus.pending, 0),
+    }
+    counter = await session.get(MailingCounter, mailing_id, populate_existing=True)
+    if counter is None:
+        session.add(MailingCounter(mailing_id=mailing_id, **values))
+    else:
+        for name, value in values.items():
+            setattr(counter, name, value)
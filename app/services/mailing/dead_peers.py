@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import exists, select
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import DeadPeer, TargetSource
+
+
+DeadPeerKey = Tuple[int, str, int]
+
+
+def peer_kind(target_source: TargetSource) -> str:
+    return "chat" if target_source == TargetSource.chats else "user"
+
+
+def not_dead_peer(owner_id: int, kind: str, peer_id_column):
+    """SQL condition keeping rows whose peer is not in the owner's dead_peers."""
+    return ~exists().where(
+        DeadPeer.owner_id == owner_id,
+        DeadPeer.peer_kind == kind,
+        DeadPeer.peer_id == peer_id_column,
+        DeadPeer.expires_at > datetime.utcnow(),
+    )
+
+
+@dataclass(frozen=True)
+class DeadPeerWrite:
+    owner_id: int
+    peer_kind: str
+    peer_id: int
+    reason: str
+    expires_at: datetime
+
+
+class DeadPeerCache:
+    """In-memory mirror of the dead_peers rows the runner has looked at.
+
+    Keyed by (owner_id, peer_kind, peer_id). The table is the source of truth;
+    :meth:`preload` pulls the rows of one claimed chunk with a single query so
+    recipients that died after they were enqueued never take a send slot.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[DeadPeerKey, Tuple[str, datetime]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, owner_id: int, kind: str, peer_id: int) -> Optional[str]:
+        key = (owner_id, kind, peer_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        reason, expires_at = entry
+        if expires_at <= datetime.utcnow():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return reason
+
+    def put(self, owner_id: int, kind: str, peer_id: int, reason: str, expires_at: datetime) -> None:
+        key = (owner_id, kind, peer_id)
+        self._entries[key] = (reason, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def preload(self, session: AsyncSession, owner_id: int, kind: str, peer_ids: Iterable[int]) -> None:
+        missing = sorted({peer_id for peer_id in peer_ids if (owner_id, kind, peer_id) not in self._entries})
+        if not missing:
+            return
+        result = await session.execute(
+            select(DeadPeer.peer_id, DeadPeer.reason, DeadPeer.expires_at).where(
+                DeadPeer.owner_id == owner_id,
+                DeadPeer.peer_kind == kind,
+                DeadPeer.peer_id.in_(missing),
+                DeadPeer.expires_at > datetime.utcnow(),
+            )
+        )
+        for peer_id, reason, expires_at in result.all():
+            self.put(owner_id, kind, peer_id, reason, expires_at)
+
+
+async def save_dead_peers(session: AsyncSession, writes: Sequence[DeadPeerWrite]) -> None:
+    """Upsert undeliverable peers; the caller commits."""
+    if not writes:
+        return
+    now = datetime.utcnow()
+    stmt = insert(DeadPeer.__table__)
+    await session.execute(
+        stmt.on_duplicate_key_update(
+            reason=stmt.inserted.reason,
+            expires_at=stmt.inserted.expires_at,
+        ),
+        [
+            {
+                "owner_id": write.owner_id,
+                "peer_kind": write.peer_kind,
+                "peer_id": write.peer_id,
+                "reason": write.reason[:255],
+                "expires_at": write.expires_at,
+                "created_at": now,
+            }
+            for write in writes
+        ],
+    )
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import asyncio
+import enum
+from collections import Counter
+from typing import Dict
+
+from telethon.errors import (
+    AuthKeyError,
+    ChannelPrivateError,
+    ChatWriteForbiddenError,
+    FloodError,
+    InputUserDeactivatedError,
+    PeerIdInvalidError,
+    PhoneNumberBannedError,
+    RPCError,
+    ServerError,
+    TimedOutError,
+    UnauthorizedError,
+    UserBannedInChannelError,
+    UserIdInvalidError,
+    UserIsBlockedError,
+    UserIsBotError,
+    UsernameInvalidError,
+    UsernameNotOccupiedError,
+    UserPrivacyRestrictedError,
+    UserRestrictedError,
+)
+
+
+class ErrorClass(str, enum.Enum):
+    # The recipient can never be reached (privacy, deleted user, invalid peer):
+    # fail it right away and do not spend the inter-message delay on it.
+    permanent = "permanent"
+    # Network or server trouble: retry the recipient later with backoff.
+    transient = "transient"
+    # The sending account itself is unusable (logged out, banned, restricted).
+    account = "account"
+
+
+class UnresolvedPeerError(ValueError):
+    """No input peer could be built for a recipient."""
+
+
+_ACCOUNT_ERRORS = (
+    UnauthorizedError,
+    AuthKeyError,
+    PhoneNumberBannedError,
+    UserBannedInChannelError,
+    UserRestrictedError,
+)
+# FloodError covers 420 answers such as a chat's slow mode; the account-wide
+# FloodWaitError is handled by the runner before classification.
+_TRANSIENT_ERRORS = (ServerError, TimedOutError, FloodError, asyncio.TimeoutError, ConnectionError, OSError)
+# Permanent errors about the peer itself, as opposed to the message content:
+# every account of the owner would get them, so the peer is dead-listed.
+_DEAD_PEER_ERRORS = (
+    InputUserDeactivatedError,
+    UsernameInvalidError,
+    UsernameNotOccupiedError,
+    UserIsBotError,
+    UserPrivacyRestrictedError,
+)
+# Permanent for the sending account only: no cached entity, a stale or foreign
+# access hash, blocked by the user, no membership or write rights in the chat.
+_UNREACHABLE_PEER_ERRORS = (
+    UnresolvedPeerError,
+    PeerIdInvalidError,
+    UserIdInvalidError,
+    UserIsBlockedError,
+    ChannelPrivateError,
+    ChatWriteForbiddenError,
+)
+
+
+def classify_error(exc: BaseException) -> ErrorClass:
+    if isinstance(exc, _ACCOUNT_ERRORS):
+        return ErrorClass.account
+    if isinstance(exc, _TRANSIENT_ERRORS):
+        return ErrorClass.transient
+    if isinstance(exc, (RPCError, UnresolvedPeerError)):
+        # Remaining RPC errors are 400/403 answers about this request or peer.
+        return ErrorClass.permanent
+    return ErrorClass.transient
+
+
+def is_dead_peer_error(exc: BaseException) -> bool:
+    return isinstance(exc, _DEAD_PEER_ERRORS)
+
+
+def is_unreachable_peer_error(exc: BaseException) -> bool:
+    return isinstance(exc, _UNREACHABLE_PEER_ERRORS)
+
+
+class MailingErrorCounts:
+    """Send failures per mailing, counted by error class and exception type."""
+
+    def __init__(self) -> None:
+        self._classes: Dict[int, Counter] = {}
+        self._types: Dict[int, Counter] = {}
+
+    def add(self, mailing_id: int, error_class: ErrorClass, exc: BaseException) -> bool:
+        """Count a failure; return True the first time this exception type shows up for the mailing."""
+        self._classes.setdefault(mailing_id, Counter())[error_class.value] += 1
+        types = self._types.setdefault(mailing_id, Counter())
+        name = type(exc).__name__
+        types[name] += 1
+        return types[name] == 1
+
+    def by_class(self, mailing_id: int) -> Dict[str, int]:
+        return dict(self._classes.get(mailing_id, {}))
+
+    def by_type(self, mailing_id: int) -> Dict[str, int]:
+        return dict(self._types.get(mailing_id, {}))
+
+    def discard(self, mailing_id: int) -> None:
+        self._classes.pop(mailing_id, None)
+        self._types.pop(mailing_id, None)
+
+    def retain(self, mailing_ids) -> None:
+        for mailing_id in [mailing_id for mailing_id in self._classes if mailing_id not in mailing_ids]:
+            self.discard(mailing_id)
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+
+MediaKey = Tuple[int, int, str]
+
+
+class UploadedMediaCache:
+    """Server-side media handles of mailing files, keyed by (mailing, account, source).
+
+    The first send of a mailing file uploads it; the media of the resulting
+    message is kept and passed to every later ``send_file`` so Telethon does
+    not read and upload the same file again. The source (media path or file
+    id) is part of the key, so editing the mailing content never reuses a
+    stale handle.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self._max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[MediaKey, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: MediaKey) -> Optional[Any]:
+        media = self._entries.get(key)
+        if media is not None:
+            self._entries.move_to_end(key)
+        return media
+
+    def put(self, key: MediaKey, media: Any) -> None:
+        self._entries[key] = media
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: MediaKey) -> None:
+        self._entries.pop(key, None)
+
+    def discard_mailing(self, mailing_id: int) -> None:
+        for key in [key for key in self._entries if key[0] == mailing_id]:
+            del self._entries[key]
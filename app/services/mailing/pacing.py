@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from typing import Optional
+
+
+# Below this the learned interval is dropped altogether.
+_MIN_INTERVAL_SECONDS = 0.05
+
+
+class AccountPacer:
+    """Send interval of one Telegram account, learned from flood errors.
+
+    Every FloodWaitError/PeerFloodError multiplies the interval by ``backoff``;
+    every successful send shrinks it by the fraction ``decay``. With the
+    default 1% it takes about 70 sends to halve, so the learned pace holds for
+    a while instead of dropping back to the floor within a few messages. A
+    mailing never sends faster than its own ``delay_seconds``: the pause
+    between two messages is the larger of the two values.
+    """
+
+    def __init__(
+        self,
+        interval: Optional[float],
+        decay: float,
+        backoff: float,
+        max_interval: float,
+    ) -> None:
+        self.interval = max(0.0, interval or 0.0)
+        self._decay = min(max(0.0, decay), 1.0)
+        self._backoff = max(1.0, backoff)
+        self._max_interval = max(0.0, max_interval)
+        self.dirty = False
+
+    def delay_for(self, floor: Optional[float]) -> float:
+        return max(float(floor or 0.0), self.interval)
+
+    def on_success(self) -> None:
+        if self.interval > 0 and self._decay > 0:
+            self.interval *= 1.0 - self._decay
+            if self.interval < _MIN_INTERVAL_SECONDS:
+                self.interval = 0.0
+            self.dirty = True
+
+    def on_flood(self, floor: Optional[float]) -> None:
+        # Back off from the pace that was actually used, which is at least the floor.
+        current = max(self.delay_for(floor), 1.0)
+        self.interval = min(self._max_interval, current * self._backoff)
+        self.dirty = True
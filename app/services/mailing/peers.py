@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerUser
+
+from app.db.models import MailingRecipient, ParsedUser, ResolvedPeer
+
+
+PeerKey = Tuple[int, str]
+
+
+def username_key(username: str) -> str:
+    return f"@{username.lstrip('@').lower()}"
+
+
+def id_key(peer_id: int) -> str:
+    return f"id:{peer_id}"
+
+
+def describe_peer(peer: Any) -> Optional[Tuple[str, int, Optional[int]]]:
+    """Return ``(peer_type, peer_id, access_hash)`` of an input peer, or None."""
+    if isinstance(peer, InputPeerUser):
+        return "user", peer.user_id, peer.access_hash
+    if isinstance(peer, InputPeerChannel):
+        return "channel", peer.channel_id, peer.access_hash
+    if isinstance(peer, InputPeerChat):
+        return "chat", peer.chat_id, None
+    return None
+
+
+def build_peer(peer_type: str, peer_id: int, access_hash: Optional[int]) -> Optional[Any]:
+    if peer_type == "user" and access_hash is not None:
+        return InputPeerUser(peer_id, access_hash)
+    if peer_type == "channel" and access_hash is not None:
+        return InputPeerChannel(peer_id, access_hash)
+    if peer_type == "chat":
+        return InputPeerChat(peer_id)
+    return None
+
+
+@dataclass(frozen=True)
+class ResolvedPeerWrite:
+    account_id: int
+    owner_id: int
+    recipient_id: int
+    recipient_user_id: int
+    keys: Tuple[str, ...]
+    peer_type: str
+    peer_id: int
+    access_hash: Optional[int]
+
+
+class ResolvedPeerCache:
+    """LRU of input peers resolved per account, backed by the resolved_peers table.
+
+    Access hashes are bound to the account that resolved them, so entries are
+    keyed by (account_id, peer key) where the key is ``@username`` or
+    ``id:<user_id>``. :meth:`preload` fills the LRU for a whole batch with one
+    query, so only peers the account has never resolved cost a
+    ``ResolveUsername`` round trip.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[PeerKey, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, account_id: int, key: str) -> Optional[Any]:
+        peer = self._entries.get((account_id, key))
+        if peer is not None:
+            self._entries.move_to_end((account_id, key))
+        return peer
+
+    def put(self, account_id: int, key: str, peer: Any) -> None:
+        self._entries[(account_id, key)] = peer
+        self._entries.move_to_end((account_id, key))
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def preload(self, session: AsyncSession, account_id: int, keys: Iterable[str]) -> None:
+        missing = sorted({key for key in keys if (account_id, key) not in self._entries})
+        if not missing:
+            return
+        result = await session.execute(
+            select(ResolvedPeer.peer_key, ResolvedPeer.peer_type, ResolvedPeer.peer_id, ResolvedPeer.access_hash).where(
+                ResolvedPeer.account_id == account_id,
+                ResolvedPeer.peer_key.in_(missing),
+            )
+        )
+        for key, peer_type, peer_id, access_hash in result.all():
+            peer = build_peer(peer_type, peer_id, access_hash)
+            if peer is not None:
+                self.put(account_id, key, peer)
+
+
+async def save_resolved_peers(session: AsyncSession, writes: Sequence[ResolvedPeerWrite]) -> None:
+    """Persist peers resolved over the network; the caller commits.
+
+    Besides the per-account cache row, the access hash is written back to the
+    recipient row (so a retry or repeat on the same account skips resolution
+    altogether) and to parsed users of the owner that were collected without
+    one, tagged with the account it belongs to.
+    """
+    if not writes:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {
+            "account_id": write.account_id,
+            "peer_key": key,
+            "peer_type": write.peer_type,
+            "peer_id": write.peer_id,
+            "access_hash": write.access_hash,
+            "resolved_at": now,
+        }
+        for write in writes
+        for key in write.keys
+    ]
+    stmt = insert(ResolvedPeer.__table__)
+    await session.execute(
+        stmt.on_duplicate_key_update(
+            peer_type=stmt.inserted.peer_type,
+            peer_id=stmt.inserted.peer_id,
+            access_hash=stmt.inserted.access_hash,
+            resolved_at=stmt.inserted.resolved_at,
+        ),
+        rows,
+    )
+
+    # A username may have changed hands since the recipient was collected; only
+    # write the hash back when it belongs to the same Telegram id.
+    matching = [
+        write
+        for write in writes
+        if write.access_hash is not None and write.peer_id == write.recipient_user_id
+    ]
+    if matching:
+        # Core UPDATE: a recipient deleted meanwhile must not fail the flush.
+        recipients = MailingRecipient.__table__
+        await session.execute(
+            update(recipients).where(recipients.c.id == bindparam("b_id")),
+            [
+                {
+                    "b_id": write.recipient_id,
+                    "access_hash": write.access_hash,
+                    "access_hash_account_id": write.account_id,
+                }
+                for write in matching
+            ],
+        )
+    users = [write for write in matching if write.peer_type == "user"]
+    if users:
+        table = ParsedUser.__table__
+        await session.execute(
+            update(table)
+            .where(
+                table.c.owner_id == bindparam("b_owner_id"),
+                table.c.user_id == bindparam("b_user_id"),
+                table.c.access_hash.is_(None),
+            )
+            .values(access_hash=bindparam("b_access_hash"), access_hash_account_id=bindparam("b_account_id")),
+            [
+                {
+                    "b_owner_id": write.owner_id,
+                    "b_user_id": write.peer_id,
+                    "b_access_hash": write.access_hash,
+                    "b_account_id": write.account_id,
+                }
+                for write in users
+            ],
+        )
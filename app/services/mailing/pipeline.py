@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+from app.db.models import RecipientStatus
+
+
+PIPELINE_STAGES = ("prefetch", "resolve", "send", "record")
+
+
+@dataclass
+class StageTiming:
+    items: int = 0
+    busy_seconds: float = 0.0
+    # Time spent blocked on the input queue: a stage that mostly waits is fed
+    # by the bottleneck, a stage that is mostly busy is the bottleneck.
+    wait_seconds: float = 0.0
+
+
+@dataclass
+class PipelineItem:
+    recipient: Any
+    target: Any = None
+    error: Optional[BaseException] = None
+
+
+@dataclass
+class SendOutcome:
+    recipient: Any
+    status: RecipientStatus
+    error: Optional[str] = None
+    # Set when the recipient stays pending: its next repeat round, or its
+    # retry after a transient failure when ``retry`` is True.
+    next_attempt_at: Optional[datetime] = None
+    retry: bool = False
+
+
+class PipelineStats:
+    """Queue depths and per-stage timing of one mailing pipeline run."""
+
+    def __init__(self, mailing_id: int, account_id: int) -> None:
+        self.mailing_id = mailing_id
+        self.account_id = account_id
+        self.started_at = time.monotonic()
+        self.timings: Dict[str, StageTiming] = {stage: StageTiming() for stage in PIPELINE_STAGES}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._max_depths: Dict[str, int] = {}
+
+    def watch(self, name: str, queue: asyncio.Queue) -> asyncio.Queue:
+        self._queues[name] = queue
+        self._max_depths[name] = 0
+        return queue
+
+    def sample(self) -> None:
+        for name, queue in self._queues.items():
+            depth = queue.qsize()
+            if depth > self._max_depths[name]:
+                self._max_depths[name] = depth
+
+    def depths(self) -> Dict[str, int]:
+        return {name: queue.qsize() for name, queue in self._queues.items()}
+
+    @contextmanager
+    def busy(self, stage: str, items: int = 1) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            timing = self.timings[stage]
+            timing.items += items
+            timing.busy_seconds += time.monotonic() - started
+            self.sample()
+
+    async def get(self, stage: str, queue: asyncio.Queue, timeout: Optional[float] = None) -> Any:
+        started = time.monotonic()
+        try:
+            if timeout is None:
+                return await queue.get()
+            return await asyncio.wait_for(queue.get(), timeout=timeout)
+        finally:
+            self.timings[stage].wait_seconds += time.monotonic() - started
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "mailing_id": self.mailing_id,
+            "account_id": self.account_id,
+            "elapsed_seconds": round(time.monotonic() - self.started_at, 3),
+            "queue_depths": self.depths(),
+            "max_queue_depths": dict(self._max_depths),
+            "stages": {
+                stage: {
+                    "items": timing.items,
+                    "busy_seconds": round(timing.busy_seconds, 3),
+                    "wait_seconds": round(timing.wait_seconds, 3),
+                }
+                for stage, timing in self.timings.items()
+            },
+        }
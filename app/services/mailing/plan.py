@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import enum
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+from telethon.extensions import markdown
+from telethon.tl.types import DocumentAttributeImageSize, DocumentAttributeSticker, InputStickerSetEmpty
+
+from app.db.models import Mailing, MessageType
+
+
+class SendStrategy(str, enum.Enum):
+    text = "text"
+    file = "file"
+    sticker_set = "sticker_set"
+
+
+@dataclass(frozen=True)
+class SendPlan:
+    """Everything needed to send a mailing, decided once per mailing.
+
+    The per-recipient path only supplies the target and, for mention
+    mailings, the username appended to the pre-parsed text.
+    """
+
+    mailing_id: int
+    strategy: SendStrategy
+    text: str = ""
+    entities: Tuple[Any, ...] = ()
+    mention: bool = False
+    file: Optional[str] = None
+    caption: bool = False
+    send_kwargs: Dict[str, Any] = field(default_factory=dict)
+    sticker_set_name: Optional[str] = None
+    sticker_set_index: Optional[int] = None
+    # Used when the sticker set no longer has the sticker at sticker_set_index.
+    fallback: Optional["SendPlan"] = None
+
+    def render_text(self, username: Optional[str]) -> str:
+        if not (self.mention and username):
+            return self.text
+        # Appending keeps the offsets of the pre-parsed entities valid.
+        return f"{self.text}\n@{username}" if self.text else f"@{username}"
+
+
+def resolve_media_path(media_path: str, base_dir: Path) -> str:
+    if os.path.isabs(media_path):
+        return media_path
+    return str((base_dir / media_path).resolve())
+
+
+def compile_send_plan(mailing: Mailing, base_dir: Path) -> SendPlan:
+    text, entities = markdown.parse(mailing.text or "")
+    base = dict(mailing_id=mailing.id, text=text, entities=tuple(entities), mention=bool(mailing.mention))
+    text_plan = SendPlan(strategy=SendStrategy.text, **base)
+
+    if mailing.message_type == MessageType.text:
+        return text_plan
+    if not mailing.media_path and not mailing.media_file_id:
+        return text_plan
+
+    if mailing.message_type == MessageType.sticker:
+        if mailing.sticker_set_name is not None:
+            fallback = None
+            if mailing.media_file_id:
+                fallback = SendPlan(
+                    strategy=SendStrategy.file,
+                    file=mailing.media_file_id,
+                    send_kwargs={"force_document": False},
+                    **base,
+                )
+            else:
+                fallback = _compile_media_path_plan(mailing, base_dir, base, text_plan)
+            if mailing.sticker_set_index is None:
+                return fallback
+            return SendPlan(
+                strategy=SendStrategy.sticker_set,
+                sticker_set_name=mailing.sticker_set_name,
+                sticker_set_index=mailing.sticker_set_index,
+                fallback=fallback,
+                **base,
+            )
+        source = resolve_media_path(mailing.media_path, base_dir) if mailing.media_path else mailing.media_file_id
+        return SendPlan(strategy=SendStrategy.file, file=source, send_kwargs={"force_document": False}, **base)
+
+    return _compile_media_path_plan(mailing, base_dir, base, text_plan)
+
+
+def _compile_media_path_plan(mailing: Mailing, base_dir: Path, base: Dict[str, Any], text_plan: SendPlan) -> SendPlan:
+    if not mailing.media_path:
+        return text_plan
+    media_path = resolve_media_path(mailing.media_path, base_dir)
+
+    if mailing.message_type == MessageType.sticker:
+        attributes = [DocumentAttributeSticker(alt="🙂", stickerset=InputStickerSetEmpty())]
+        ext = Path(media_path).suffix.lower()
+        try:
+            if ext == ".webp":
+                with Image.open(media_path) as image:
+                    width, height = image.size
+                attributes.insert(0, DocumentAttributeImageSize(w=width, h=height))
+        except Exception:
+            pass
+        return SendPlan(
+            strategy=SendStrategy.file,
+            file=media_path,
+            send_kwargs={"attributes": attributes, "force_document": ext in (".tgs", ".webm")},
+            **base,
+        )
+
+    if mailing.message_type == MessageType.voice:
+        return SendPlan(strategy=SendStrategy.file, file=media_path, **base)
+
+    return SendPlan(strategy=SendStrategy.file, file=media_path, caption=True, **base)
@@ -1,278 +1,1079 @@
 from __future__ import annotations
 
 import asyncio
+import heapq
 import logging
 import os
-from datetime import datetime
+import socket
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-from PIL import Image
-from telethon.errors import RPCError
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from telethon.errors import FileReferenceExpiredError, FloodWaitError, PeerFloodError, RPCError
 from telethon.tl.functions.messages import GetStickerSetRequest
-from telethon.tl.types import (
-    DocumentAttributeImageSize,
-    DocumentAttributeSticker,
-    InputPeerChannel,
-    InputPeerChat,
-    InputPeerUser,
-    InputStickerSetEmpty,
-    InputStickerSetShortName,
-)
+from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerUser, InputStickerSetShortName
 
 from app.client.telethon_manager import TelethonManager
 from app.core.config import get_settings
+from app.core.memory import memory_snapshot
+from app.core.metrics import (
+    db_commit_latency,
+    flood_wait_seconds,
+    messages_failed,
+    messages_sent,
+    pipeline_queue_depth,
+    send_latency,
+)
 from app.db.models import (
     Account,
     Mailing,
     MailingRecipient,
     MailingStatus,
-    MessageType,
     RecipientStatus,
     TargetSource,
 )
+from app.services.mailing.control import mailing_control
 from app.services.mailing.logs import append_recipient_log
+from app.services.mailing.media import UploadedMediaCache
+from app.services.mailing.dead_peers import DeadPeerCache, DeadPeerWrite, peer_kind
+from app.services.mailing.errors import (
+    ErrorClass,
+    MailingErrorCounts,
+    UnresolvedPeerError,
+    classify_error,
+    is_dead_peer_error,
+    is_unreachable_peer_error,
+)
+from app.services.mailing.pacing import AccountPacer
+from app.services.mailing.peers import ResolvedPeerCache, ResolvedPeerWrite, describe_peer, id_key, username_key
+from app.services.mailing.pipeline import PipelineItem, PipelineStats, SendOutcome
+from app.services.mailing.plan import SendPlan, SendStrategy, compile_send_plan
+from app.services.mailing.stickers import get_sticker_set_cache
+from app.services.mailing.writeback import RecipientStatusBuffer
 from app.services.auth import AccountService
 from app.services.billing import BillingService
 
 
+# Extra time on top of the FloodWaitError deadline before an account is retried.
+FLOOD_WAIT_MARGIN_SECONDS = 1.0
+# How soon a drained mailing whose recipients are still being enqueued is looked at again.
+ENQUEUE_RECHECK_SECONDS = 5.0
+# How soon a mailing that ran out of funds held by another turn is looked at again.
+BALANCE_RECHECK_SECONDS = 5.0
+
+
 class _InsufficientBalanceError(RuntimeError):
     pass
 
 
 class MailingRunner:
-    def __init__(self, session: AsyncSession, manager: TelethonManager) -> None:
-        self._session = session
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        manager: TelethonManager,
+        shard_index: int = 0,
+        shard_count: int = 1,
+    ) -> None:
+        self._session_factory = session_factory
         self._manager = manager
+        self._shard_index = shard_index
+        self._shard_count = max(1, shard_count)
         self._running = False
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._assignments: Dict[int, List[int]] = {}
+        self._mailing_accounts: Dict[int, int] = {}
+        self._due: List[Tuple[float, int]] = []
+        self._due_at: Dict[int, float] = {}
+        self._balance_wait_until: Dict[int, float] = {}
+        self._cursors: Dict[int, int] = {}
+        self._uploads = UploadedMediaCache()
+        self._peers = ResolvedPeerCache(get_settings().peer_cache_size)
+        self._dead_peers = DeadPeerCache(get_settings().dead_peer_cache_size)
+        # Same structure keyed by account id instead of owner id, never persisted.
+        self._unreachable_peers = DeadPeerCache(get_settings().dead_peer_cache_size)
+        self._plans: Dict[int, Tuple[datetime, SendPlan]] = {}
+        self._prices: Dict[bool, Tuple[float, float]] = {}
+        self._pipelines: Dict[int, PipelineStats] = {}
+        self._pacers: Dict[int, AccountPacer] = {}
+        self._errors = MailingErrorCounts()
+        self._runner_id = get_settings().mailing_runner_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._parked: List[Tuple[float, int]] = []
+        self._parked_until: Dict[int, float] = {}
         self._base_dir = Path(__file__).resolve().parents[3]
         self._logger = logging.getLogger(__name__)
+        pipeline_queue_depth.set_callback(self._queue_depths)
 
     async def run_forever(self) -> None:
+        # Event-driven scheduling: sleep until the earliest due mailing, parked
+        # account or reconciliation, and wake up early on create/resume signals.
         self._running = True
         settings = get_settings()
-        while self._running:
-            await self._process_all(settings.mailing_batch_size)
-            await asyncio.sleep(1)
+        batch_size = settings.mailing_batch_size
+        reconcile_at = 0.0
+        probe_at = 0.0
+        memory_at = time.monotonic() + settings.mailing_memory_log_seconds
+        fingerprint = None
+        try:
+            while self._running:
+                now = time.monotonic()
+                if now >= probe_at:
+                    probe_at = now + settings.mailing_probe_seconds
+                    current = await self._probe_running()
+                    if current != fingerprint:
+                        fingerprint = current
+                        reconcile_at = 0.0
+                if now >= reconcile_at:
+                    await self._release_expired_holds()
+                    await self._dispatch(batch_size)
+                    reconcile_at = now + settings.mailing_reconcile_seconds
+                if now >= memory_at:
+                    memory_at = now + settings.mailing_memory_log_seconds
+                    self._logger.info("Mailing runner memory %s", self.memory_snapshot())
+                self._start_due_workers(batch_size)
+                wake_at = min(reconcile_at, probe_at, self._next_due_at())
+                if await mailing_control.wait_for_wakeup(wake_at - time.monotonic()):
+                    reconcile_at = 0.0
+        finally:
+            await self._stop_workers()
 
     async def stop(self) -> None:
         self._running = False
+        mailing_control.notify()
 
-    async def _process_all(self, batch_size: int) -> None:
-        try:
-            result = await self._session.execute(select(Mailing).where(Mailing.status == MailingStatus.running))
-            mailings = result.scalars().all()
-            if not mailings:
-                return
+    def _running_query(self, *columns):
+        query = select(*columns).where(Mailing.status == MailingStatus.running)
+        if self._shard_count > 1:
+            # All mailings of an owner land on the same shard, so its accounts
+            # are only ever driven by one worker process.
+            query = query.where(Mailing.owner_id % self._shard_count == self._shard_index)
+        return query
 
-            for mailing in mailings:
-                await self._process_mailing(mailing, batch_size)
-        finally:
-            await self._session.rollback()
-
-    async def _process_mailing(self, mailing: Mailing, batch_size: int) -> None:
-        account = await self._resolve_account(mailing)
-        if not account:
-            mailing.status = MailingStatus.failed
-            mailing.updated_at = datetime.utcnow()
-            await self._session.commit()
+    async def _probe_running(self) -> Tuple[int, Optional[datetime]]:
+        # Cheap change detection for mailings created or resumed by other processes.
+        async with self._session_factory() as session:
+            result = await session.execute(self._running_query(func.count(Mailing.id), func.max(Mailing.updated_at)))
+            count, last_updated = result.one()
+        return int(count or 0), last_updated
+
+    async def _release_expired_holds(self) -> None:
+        # Billing holds of runs that crashed or were killed before settling.
+        try:
+            async with self._session_factory() as session:
+                released = await BillingService(session).release_expired_holds()
+        except Exception:
+            self._logger.exception("Releasing expired billing holds failed")
             return
+        if released:
+            self._logger.info("Released expired billing holds count=%s", released)
 
-        billing = BillingService(self._session)
-        price_message = await billing.get_price("mailing_message")
-        price_mention = await billing.get_price("mailing_message_mention")
-        price_per_message = price_message + (price_mention if mailing.mention else 0.0)
+    async def _dispatch(self, batch_size: int) -> None:
+        assignments: Dict[int, List[int]] = {}
+        async with self._session_factory() as session:
+            result = await session.execute(self._running_query(Mailing).order_by(Mailing.id))
+            for mailing in result.scalars().all():
+                account = await self._resolve_account(session, mailing)
+                if not account:
+                    mailing.status = MailingStatus.failed
+                    mailing.updated_at = datetime.utcnow()
+                    continue
+                assignments.setdefault(account.id, []).append(mailing.id)
+                # Resumes made by other processes are only visible through the DB.
+                mailing_control.release(mailing.id)
+            await session.commit()
 
-        client = await self._manager.get_client(account)
-        pending = await self._session.execute(
-            select(MailingRecipient)
-            .where(
-                MailingRecipient.mailing_id == mailing.id,
-                MailingRecipient.status == RecipientStatus.pending,
-            )
+        self._assignments = assignments
+        self._mailing_accounts = {
+            mailing_id: account_id for account_id, mailing_ids in assignments.items() for mailing_id in mailing_ids
+        }
+        self._release_parked_accounts()
+        self._prune_state()
+        for account_id in assignments:
+            self._start_worker(account_id, batch_size)
+
+    def _prune_state(self) -> None:
+        # Per-mailing and per-account state only lives while the mailing runs, so
+        # a long-lived runner stays flat however many mailings it has seen.
+        running = set(self._mailing_accounts)
+        for mailing_id in [mailing_id for mailing_id in self._cursors if mailing_id not in running]:
+            del self._cursors[mailing_id]
+        for mailing_id in [mailing_id for mailing_id in self._plans if mailing_id not in running]:
+            del self._plans[mailing_id]
+            self._uploads.discard_mailing(mailing_id)
+        self._errors.retain(running)
+        for mailing_id in [mailing_id for mailing_id in self._due_at if mailing_id not in running]:
+            del self._due_at[mailing_id]
+        for mailing_id in [mailing_id for mailing_id in self._balance_wait_until if mailing_id not in running]:
+            del self._balance_wait_until[mailing_id]
+        self._workers = {account_id: task for account_id, task in self._workers.items() if not task.done()}
+        for account_id in [
+            account_id
+            for account_id, pacer in self._pacers.items()
+            if account_id not in self._assignments and account_id not in self._workers and not pacer.dirty
+        ]:
+            # Reloaded from accounts.send_interval_seconds when the account sends again.
+            del self._pacers[account_id]
+
+    def memory_snapshot(self) -> Dict[str, int]:
+        """Process memory plus the sizes of the runner's long-lived structures."""
+        snapshot = memory_snapshot()
+        snapshot.update(
+            workers=len(self._workers),
+            cursors=len(self._cursors),
+            plans=len(self._plans),
+            pacers=len(self._pacers),
+            uploads=len(self._uploads),
+            peers=len(self._peers),
+            dead_peers=len(self._dead_peers),
+            unreachable_peers=len(self._unreachable_peers),
+            due=len(self._due),
         )
-        recipients = pending.scalars().all()
-        if not recipients:
-            mailing.status = MailingStatus.done
-            mailing.updated_at = datetime.utcnow()
-            await self._session.commit()
+        return snapshot
+
+    def _start_worker(self, account_id: int, batch_size: int) -> None:
+        worker = self._workers.get(account_id)
+        if worker is not None and not worker.done():
             return
+        if account_id in self._parked_until or account_id not in self._assignments:
+            return
+        self._workers[account_id] = asyncio.create_task(self._account_worker(account_id, batch_size))
 
-        for recipient in recipients[:batch_size]:
-            refreshed = await self._session.execute(select(Mailing).where(Mailing.id == mailing.id))
-            current = refreshed.scalars().first()
-            if not current or current.status != MailingStatus.running:
-                break
+    def _schedule(self, mailing_id: int, delay: float) -> None:
+        due_at = time.monotonic() + max(0.0, delay)
+        if self._due_at.get(mailing_id, float("inf")) <= due_at:
+            # The mailing is looked at again before then anyway.
+            return
+        self._due_at[mailing_id] = due_at
+        heapq.heappush(self._due, (due_at, mailing_id))
+        # run_forever may be sleeping towards a later deadline.
+        mailing_control.notify(reconcile=False)
 
-            try:
-                await self._send_to_recipient(client, mailing, recipient, billing, price_per_message)
-                recipient.status = RecipientStatus.sent
-                recipient.sent_at = datetime.utcnow()
-                recipient.error = None
-            except _InsufficientBalanceError:
-                mailing.status = MailingStatus.failed
+    def _next_due_at(self) -> float:
+        candidates = [entry[0] for entry in (self._due[:1] + self._parked[:1])]
+        return min(candidates) if candidates else float("inf")
+
+    def _start_due_workers(self, batch_size: int) -> None:
+        for account_id in self._release_parked_accounts():
+            self._start_worker(account_id, batch_size)
+        now = time.monotonic()
+        while self._due and self._due[0][0] <= now:
+            due_at, mailing_id = heapq.heappop(self._due)
+            # Stale heap entries are left behind when a mailing is rescheduled sooner.
+            if self._due_at.get(mailing_id) != due_at:
+                continue
+            del self._due_at[mailing_id]
+            account_id = self._mailing_accounts.get(mailing_id)
+            if account_id is not None:
+                self._start_worker(account_id, batch_size)
+
+    def _park_account(self, account_id: int, seconds: float) -> None:
+        deadline = time.monotonic() + seconds + FLOOD_WAIT_MARGIN_SECONDS
+        if deadline <= self._parked_until.get(account_id, 0.0):
+            return
+        self._parked_until[account_id] = deadline
+        heapq.heappush(self._parked, (deadline, account_id))
+        mailing_control.notify(reconcile=False)
+
+    def _release_parked_accounts(self) -> List[int]:
+        now = time.monotonic()
+        released = []
+        while self._parked and self._parked[0][0] <= now:
+            deadline, account_id = heapq.heappop(self._parked)
+            # Stale heap entries are left behind when an account is re-parked longer.
+            if self._parked_until.get(account_id) == deadline:
+                del self._parked_until[account_id]
+                released.append(account_id)
+        return released
+
+    async def _stop_workers(self) -> None:
+        workers = list(self._workers.values())
+        self._workers.clear()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _account_worker(self, account_id: int, batch_size: int) -> None:
+        # One worker per Telegram account: mailings on different accounts run in
+        # parallel, while the delay only paces the queue of this account.
+        try:
+            while self._running:
+                processed = 0
+                for mailing_id in list(self._assignments.get(account_id, [])):
+                    if not self._running:
+                        return
+                    processed += await self._process_mailing(account_id, mailing_id, batch_size)
+                    if account_id in self._parked_until:
+                        return
+                if not processed:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._logger.exception("Mailing worker crashed account_id=%s", account_id)
+
+    async def _process_mailing(self, account_id: int, mailing_id: int, batch_size: int) -> int:
+        settings = get_settings()
+        if self._balance_wait_until.get(mailing_id, 0.0) > time.monotonic():
+            return 0
+        self._balance_wait_until.pop(mailing_id, None)
+        async with self._session_factory() as session:
+            result = await session.execute(select(Mailing).where(Mailing.id == mailing_id))
+            mailing = result.scalars().first()
+            if not mailing:
+                self._uploads.discard_mailing(mailing_id)
+                self._plans.pop(mailing_id, None)
+                self._errors.discard(mailing_id)
+                mailing_control.forget(mailing_id)
+                return 0
+            if mailing.status != MailingStatus.running:
+                return 0
+            account = await session.get(Account, account_id)
+            if not account:
+                return 0
+
+            price_per_message = await self._get_price_per_message(session, mailing.mention)
+            pacer = self._get_pacer(account)
+
+            client = await self._manager.get_client(account)
+            chunk_size = max(1, min(settings.mailing_prefetch_size, batch_size))
+            recipients = await self._claim_batch(session, mailing, self._cursors.get(mailing.id, 0), chunk_size)
+            if not recipients:
+                if self._due_at.get(mailing.id, 0.0) > time.monotonic():
+                    # Already scheduled: the worker came here for another mailing.
+                    return 0
+                wait = await self._pending_wait(session, mailing.id)
+                if wait is not None:
+                    # Everything left is leased by another runner or waits for a
+                    # later repeat round: come back when the earliest one is due.
+                    self._schedule(mailing.id, wait)
+                    return 0
+                if mailing.enqueued_at is None:
+                    # Recipients are still being enqueued (or the enqueue is
+                    # waiting to be resumed): not done yet.
+                    self._schedule(mailing.id, ENQUEUE_RECHECK_SECONDS)
+                    return 0
+                mailing.status = MailingStatus.done
                 mailing.updated_at = datetime.utcnow()
-                recipient.status = RecipientStatus.failed
-                recipient.error = "Insufficient balance"
-                append_recipient_log(
-                    mailing.id,
-                    recipient.user_id,
-                    recipient.username,
-                    "Insufficient balance",
+                self._cursors.pop(mailing.id, None)
+                self._uploads.discard_mailing(mailing.id)
+                self._plans.pop(mailing.id, None)
+                self._errors.discard(mailing.id)
+                mailing_control.forget(mailing.id)
+                await session.commit()
+                return 0
+
+            plan = self._get_plan(mailing)
+            failures_before = sum(self._errors.by_class(mailing.id).values())
+            buffer = RecipientStatusBuffer(
+                session,
+                mailing.id,
+                settings.mailing_flush_size,
+                settings.mailing_flush_interval_ms,
+            )
+            # prefetch -> resolve -> send -> record, connected by bounded queues.
+            # Only the prefetch and record stages touch the database, so the send
+            # stage paces messages without waiting on commits or resolution.
+            stats = PipelineStats(mailing.id, account_id)
+            self._pipelines[mailing.id] = stats
+            resolve_queue = stats.watch("resolve", asyncio.Queue(maxsize=chunk_size))
+            send_queue = stats.watch("send", asyncio.Queue(maxsize=max(1, settings.mailing_resolve_ahead)))
+            # Unbounded so the send stage never blocks on it; a turn records at
+            # most batch_size outcomes.
+            record_queue = stats.watch("record", asyncio.Queue())
+            claimed: Dict[int, Row] = {}
+            handled: Set[int] = set()
+            # Failed by the prefetch stage from the dead-peer caches, never sent.
+            skipped: Set[int] = set()
+            stages = [
+                asyncio.create_task(
+                    self._prefetch_stage(
+                        account_id,
+                        mailing,
+                        recipients,
+                        batch_size,
+                        chunk_size,
+                        buffer,
+                        price_per_message,
+                        claimed,
+                        skipped,
+                        resolve_queue,
+                        record_queue,
+                        stats,
+                    )
+                ),
+                asyncio.create_task(
+                    self._resolve_stage(client, account_id, mailing, buffer, resolve_queue, send_queue, stats)
+                ),
+            ]
+            recorder = asyncio.create_task(self._record_stage(mailing, buffer, record_queue, stats))
+            processed = 0
+            try:
+                processed = await self._send_stage(
+                    client,
+                    account_id,
+                    plan,
+                    mailing,
+                    buffer,
+                    price_per_message,
+                    pacer,
+                    send_queue,
+                    record_queue,
+                    handled,
+                    stats,
                 )
-                await self._session.commit()
+            finally:
+                for task in stages:
+                    task.cancel()
+                await asyncio.gather(*stages, return_exceptions=True)
+                record_queue.put_nowait(None)
+                try:
+                    await recorder
+                except Exception:
+                    self._logger.exception("Mailing record stage failed mailing_id=%s", mailing.id)
+                # Cache hits count as progress too, or a turn made only of them
+                # would leave the mailing idle until the next reconcile.
+                processed += len(skipped)
+                unprocessed = [
+                    recipient_id
+                    for recipient_id in claimed
+                    if recipient_id not in handled and recipient_id not in skipped
+                ]
+                if unprocessed:
+                    buffer.release_leases(unprocessed, self._runner_id)
+                if pacer.dirty:
+                    pacer.dirty = False
+                    await session.execute(
+                        update(Account).where(Account.id == account_id).values(send_interval_seconds=pacer.interval)
+                    )
+                # Forced flush on pause, stop, flood wait, insufficient balance and turn
+                # end; billing reservations are settled with the last status rows.
+                try:
+                    await buffer.close()
+                except Exception:
+                    self._logger.exception("Mailing status close failed mailing_id=%s", mailing.id)
+                self._pipelines.pop(mailing.id, None)
+                self._logger.debug("Mailing pipeline finished %s", stats.snapshot())
+                if sum(self._errors.by_class(mailing.id).values()) != failures_before:
+                    self._logger.info(
+                        "Mailing send errors mailing_id=%s classes=%s types=%s",
+                        mailing.id,
+                        self._errors.by_class(mailing.id),
+                        self._errors.by_type(mailing.id),
+                    )
+            return processed
+
+    def pipeline_snapshots(self) -> List[dict]:
+        """Queue depths and per-stage timing of the pipelines running right now."""
+        return [stats.snapshot() for stats in self._pipelines.values()]
+
+    def _queue_depths(self) -> Dict[Tuple[str, ...], float]:
+        # Called from the metrics HTTP thread: copy before iterating.
+        depths: Dict[Tuple[str, ...], float] = {("due",): len(self._due)}
+        for stats in list(self._pipelines.values()):
+            for name, depth in stats.depths().items():
+                depths[(name,)] = depths.get((name,), 0) + depth
+        return depths
+
+    async def _prefetch_stage(
+        self,
+        account_id: int,
+        mailing: Mailing,
+        first: Sequence[Row],
+        limit: int,
+        chunk_size: int,
+        buffer: RecipientStatusBuffer,
+        price_per_message: float,
+        claimed: Dict[int, Row],
+        skipped: Set[int],
+        outbox: asyncio.Queue,
+        record_queue: asyncio.Queue,
+        stats: PipelineStats,
+    ) -> None:
+        # Claims the turn chunk by chunk: sending starts after the first small
+        # claim and the next chunk is leased while the previous one is sent.
+        kind = peer_kind(mailing.target_source)
+        rows = first
+        try:
+            async with self._session_factory() as session:
+                while rows:
+                    with stats.busy("prefetch", len(rows)):
+                        for row in rows:
+                            claimed[row.id] = row
+                        # Peers marked dead after the recipient was enqueued go
+                        # straight to the record stage.
+                        await self._dead_peers.preload(session, mailing.owner_id, kind, [row.user_id for row in rows])
+                        live = []
+                        for row in rows:
+                            reason = self._dead_peers.get(mailing.owner_id, kind, row.user_id)
+                            if reason is not None:
+                                error = f"Dead peer: {reason}"
+                            else:
+                                reason = self._unreachable_peers.get(account_id, kind, row.user_id)
+                                if reason is None:
+                                    live.append(row)
+                                    continue
+                                error = f"Unreachable from account: {reason}"
+                            skipped.add(row.id)
+                            record_queue.put_nowait(SendOutcome(row, RecipientStatus.failed, error))
+                            messages_failed.inc(
+                                message_type=mailing.message_type.value, error_class=ErrorClass.permanent.value
+                            )
+                        if price_per_message > 0 and live:
+                            await buffer.reserve(
+                                mailing.owner_id,
+                                price_per_message * len(live),
+                                unit=price_per_message,
+                                reason="mailing_message",
+                                # Outlives the turn; only a hold whose runner died stays past it.
+                                expires_at=datetime.utcnow()
+                                + timedelta(seconds=self._lease_seconds(mailing, limit)),
+                            )
+                        await self._peers.preload(
+                            session,
+                            account_id,
+                            [
+                                key
+                                for row in live
+                                if not self._stored_hash(row, account_id)
+                                for key in self._peer_keys(mailing, row)
+                            ],
+                        )
+                    for row in live:
+                        await outbox.put(row)
+                    remaining = limit - len(claimed)
+                    if remaining <= 0:
+                        break
+                    with stats.busy("prefetch", 0):
+                        rows = await self._claim_batch(
+                            session, mailing, rows[-1].id, min(chunk_size, remaining), ahead=len(claimed)
+                        )
+        except Exception:
+            self._logger.exception("Mailing prefetch stage failed mailing_id=%s", mailing.id)
+        await outbox.put(None)
+
+    async def _resolve_stage(
+        self,
+        client,
+        account_id: int,
+        mailing: Mailing,
+        buffer: RecipientStatusBuffer,
+        inbox: asyncio.Queue,
+        outbox: asyncio.Queue,
+        stats: PipelineStats,
+    ) -> None:
+        # Resolves peers ahead of the send stage. The bounded outbox caps how far
+        # it runs ahead, which also keeps ResolveUsername calls at the send pace.
+        while True:
+            recipient = await stats.get("resolve", inbox)
+            if recipient is None:
+                break
+            item = PipelineItem(recipient)
+            with stats.busy("resolve"):
+                try:
+                    item.target = await self._resolve_target_entity(client, account_id, mailing, recipient, buffer)
+                except Exception as exc:
+                    item.error = exc
+            await outbox.put(item)
+            if isinstance(item.error, FloodWaitError):
+                # The send stage parks the account when it reaches this item.
+                return
+        await outbox.put(None)
+
+    async def _send_stage(
+        self,
+        client,
+        account_id: int,
+        plan: SendPlan,
+        mailing: Mailing,
+        buffer: RecipientStatusBuffer,
+        price_per_message: float,
+        pacer: AccountPacer,
+        inbox: asyncio.Queue,
+        outbox: asyncio.Queue,
+        handled: Set[int],
+        stats: PipelineStats,
+    ) -> int:
+        processed = 0
+        while not mailing_control.is_halted(mailing.id):
+            item = await stats.get("send", inbox)
+            if item is None or mailing_control.is_halted(mailing.id):
+                break
+            recipient = item.recipient
+            processed += 1
+            delay = pacer.delay_for(mailing.delay_seconds)
+            message_type = mailing.message_type.value
+            with stats.busy("send"):
+                try:
+                    if item.error is not None:
+                        raise item.error
+                    started = time.monotonic()
+                    await self._send_to_recipient(
+                        client, account_id, plan, mailing, recipient, item.target, buffer, price_per_message
+                    )
+                    send_latency.observe(time.monotonic() - started, message_type=message_type)
+                    messages_sent.inc(message_type=message_type)
+                    outbox.put_nowait(self._sent_outcome(mailing, recipient))
+                    pacer.on_success()
+                except FloodWaitError as exc:
+                    # The recipient stays pending and is retried once the account is unparked.
+                    flood_wait_seconds.inc(exc.seconds, account_id=account_id)
+                    pacer.on_flood(mailing.delay_seconds)
+                    self._logger.warning(
+                        "Account flood-waited, parking account_id=%s seconds=%s mailing_id=%s interval=%.2f",
+                        account_id,
+                        exc.seconds,
+                        mailing.id,
+                        pacer.interval,
+                    )
+                    self._park_account(account_id, exc.seconds)
+                    break
+                except PeerFloodError:
+                    pacer.on_flood(mailing.delay_seconds)
+                    park_seconds = get_settings().mailing_peer_flood_park_seconds
+                    self._logger.warning(
+                        "Account hit PeerFlood, parking account_id=%s seconds=%s mailing_id=%s interval=%.2f",
+                        account_id,
+                        park_seconds,
+                        mailing.id,
+                        pacer.interval,
+                    )
+                    self._park_account(account_id, park_seconds)
+                    break
+                except _InsufficientBalanceError:
+                    if await buffer.held_elsewhere(mailing.owner_id):
+                        # Another turn of the same owner holds the rest of the balance and
+                        # gives back what it does not spend when it ends: keep the
+                        # recipient pending and try again once that had a chance to happen.
+                        self._balance_wait_until[mailing.id] = time.monotonic() + BALANCE_RECHECK_SECONDS
+                        self._schedule(mailing.id, BALANCE_RECHECK_SECONDS)
+                        break
+                    messages_failed.inc(message_type=message_type, error_class="balance")
+                    mailing.status = MailingStatus.failed
+                    mailing.updated_at = datetime.utcnow()
+                    outbox.put_nowait(SendOutcome(recipient, RecipientStatus.failed, "Insufficient balance"))
+                    self._cursors.pop(mailing.id, None)
+                    handled.add(recipient.id)
+                    break
+                except Exception as exc:
+                    error_class = classify_error(exc)
+                    messages_failed.inc(message_type=message_type, error_class=error_class.value)
+                    if self._errors.add(mailing.id, error_class, exc):
+                        # One traceback per exception type and mailing; the rest is counted.
+                        self._logger.warning(
+                            "Mailing send failed class=%s mailing_id=%s recipient=%s type=%s set=%s index=%s",
+                            error_class.value,
+                            mailing.id,
+                            recipient.user_id,
+                            mailing.message_type.value,
+                            mailing.sticker_set_name,
+                            mailing.sticker_set_index,
+                            exc_info=exc,
+                        )
+                    if error_class == ErrorClass.account:
+                        # The recipient stays pending for another account or a later turn.
+                        park_seconds = get_settings().mailing_account_error_park_seconds
+                        self._logger.warning(
+                            "Account unusable, parking account_id=%s seconds=%s error=%s",
+                            account_id,
+                            park_seconds,
+                            type(exc).__name__,
+                        )
+                        self._park_account(account_id, park_seconds)
+                        break
+                    error = f"{type(exc).__name__}: {exc}"
+                    if error_class == ErrorClass.transient:
+                        outbox.put_nowait(self._retry_outcome(recipient, error, getattr(exc, "seconds", None)))
+                    else:
+                        if is_dead_peer_error(exc):
+                            self._mark_dead_peer(mailing, recipient, buffer, type(exc).__name__)
+                        elif is_unreachable_peer_error(exc):
+                            self._unreachable_peers.put(
+                                account_id,
+                                peer_kind(mailing.target_source),
+                                recipient.user_id,
+                                type(exc).__name__,
+                                datetime.utcnow()
+                                + timedelta(seconds=get_settings().mailing_unreachable_peer_ttl_seconds),
+                            )
+                        outbox.put_nowait(SendOutcome(recipient, RecipientStatus.failed, error))
+                        # Nothing reached the recipient, so there is nothing to pace.
+                        delay = 0.0
+            handled.add(recipient.id)
+            self._cursors[mailing.id] = recipient.id
+            if await mailing_control.sleep(mailing.id, delay):
                 break
-            except Exception as exc:
-                self._logger.exception(
-                    "Mailing send failed mailing_id=%s recipient=%s username=%s type=%s media_path=%s media_file_id=%s set=%s index=%s",
-                    mailing.id,
-                    recipient.user_id,
-                    recipient.username,
-                    mailing.message_type.value,
-                    mailing.media_path,
-                    mailing.media_file_id,
-                    mailing.sticker_set_name,
-                    mailing.sticker_set_index,
+        return processed
+
+    def _mark_dead_peer(self, mailing: Mailing, recipient: Row, buffer: RecipientStatusBuffer, reason: str) -> None:
+        write = DeadPeerWrite(
+            owner_id=mailing.owner_id,
+            peer_kind=peer_kind(mailing.target_source),
+            peer_id=recipient.user_id,
+            reason=reason,
+            expires_at=datetime.utcnow() + timedelta(days=get_settings().mailing_dead_peer_ttl_days),
+        )
+        self._dead_peers.put(write.owner_id, write.peer_kind, write.peer_id, write.reason, write.expires_at)
+        buffer.add_dead_peer(write)
+
+    def _sent_outcome(self, mailing: Mailing, recipient: Row) -> SendOutcome:
+        # Repeats are future-dated sends of the same row rather than sleeps, so
+        # the account keeps sending to other recipients in between.
+        repeat_count = max(1, int(mailing.repeat_count or 1))
+        if recipient.attempt_round + 1 < repeat_count:
+            next_attempt_at = datetime.utcnow() + timedelta(seconds=float(mailing.repeat_delay_seconds or 0))
+            return SendOutcome(recipient, RecipientStatus.pending, next_attempt_at=next_attempt_at)
+        return SendOutcome(recipient, RecipientStatus.sent)
+
+    def _retry_outcome(self, recipient: Row, error: str, wait_seconds: Optional[int] = None) -> SendOutcome:
+        settings = get_settings()
+        if wait_seconds is not None:
+            # A flood error (e.g. a chat's slow mode) says when the peer takes
+            # messages again: wait that long, and do not give up on the recipient.
+            backoff = wait_seconds + FLOOD_WAIT_MARGIN_SECONDS
+        elif recipient.retry_count >= settings.mailing_max_retries:
+            return SendOutcome(recipient, RecipientStatus.failed, error)
+        else:
+            backoff = min(
+                settings.mailing_retry_backoff_max_seconds,
+                settings.mailing_retry_backoff_seconds * 2 ** recipient.retry_count,
+            )
+        next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+        return SendOutcome(recipient, RecipientStatus.pending, error, next_attempt_at=next_attempt_at, retry=True)
+
+    async def _record_stage(
+        self,
+        mailing: Mailing,
+        buffer: RecipientStatusBuffer,
+        inbox: asyncio.Queue,
+        stats: PipelineStats,
+    ) -> None:
+        # Write-behind of send outcomes, plus the periodic status check that
+        # notices pauses made by other processes.
+        settings = get_settings()
+        check_interval = settings.mailing_status_check_seconds
+        flush_interval = max(0.05, settings.mailing_flush_interval_ms / 1000.0)
+        checked_at = time.monotonic()
+        while True:
+            try:
+                outcome = await stats.get("record", inbox, timeout=min(check_interval, flush_interval))
+            except asyncio.TimeoutError:
+                outcome = ()
+            if outcome is None:
+                return
+            with stats.busy("record", 1 if outcome else 0):
+                if outcome:
+                    recipient = outcome.recipient
+                    if outcome.retry:
+                        buffer.retry_later(
+                            recipient.id, recipient.retry_count + 1, outcome.next_attempt_at, outcome.error
+                        )
+                    elif outcome.next_attempt_at is not None:
+                        buffer.reschedule(recipient.id, recipient.attempt_round + 1, outcome.next_attempt_at)
+                    else:
+                        buffer.add(recipient.id, outcome.status, error=outcome.error)
+                        if outcome.error:
+                            append_recipient_log(mailing.id, recipient.user_id, recipient.username, outcome.error)
+                try:
+                    await buffer.flush_if_due()
+                    if time.monotonic() - checked_at >= check_interval:
+                        checked_at = time.monotonic()
+                        if not await self._is_still_running(mailing.id):
+                            mailing_control.halt(mailing.id)
+                except Exception:
+                    # The rows stay buffered and are retried; the stage must keep
+                    # draining outcomes or sent messages would never be recorded.
+                    self._logger.exception("Mailing status flush failed mailing_id=%s", mailing.id)
+
+    def _get_pacer(self, account: Account) -> AccountPacer:
+        pacer = self._pacers.get(account.id)
+        if pacer is None:
+            settings = get_settings()
+            pacer = AccountPacer(
+                account.send_interval_seconds,
+                decay=settings.mailing_pacing_decay,
+                backoff=settings.mailing_pacing_backoff,
+                max_interval=settings.mailing_pacing_max_seconds,
+            )
+            self._pacers[account.id] = pacer
+        return pacer
+
+    async def _get_price_per_message(self, session: AsyncSession, mention: bool) -> float:
+        now = time.monotonic()
+        cached = self._prices.get(mention)
+        if cached is None or now - cached[0] >= get_settings().billing_price_cache_seconds:
+            cached = (now, await BillingService(session).get_message_price(mention))
+            self._prices[mention] = cached
+        return cached[1]
+
+    def _get_plan(self, mailing: Mailing) -> SendPlan:
+        # Content edits bump updated_at, which invalidates the compiled plan.
+        cached = self._plans.get(mailing.id)
+        if cached and cached[0] == mailing.updated_at:
+            return cached[1]
+        plan = compile_send_plan(mailing, self._base_dir)
+        self._plans[mailing.id] = (mailing.updated_at, plan)
+        return plan
+
+    async def _is_still_running(self, mailing_id: int) -> bool:
+        # A session of its own: the turn's session may sit in a transaction whose
+        # snapshot predates the pause.
+        async with self._session_factory() as session:
+            result = await session.execute(select(Mailing.status).where(Mailing.id == mailing_id))
+            return result.scalar() == MailingStatus.running
+
+    async def _claim_batch(
+        self,
+        session: AsyncSession,
+        mailing: Mailing,
+        after_id: int,
+        limit: int,
+        ahead: int = 0,
+    ) -> Sequence[Row]:
+        # Keyset pagination: continue after the last claimed id so each claim reads
+        # at most ``limit`` light rows, whatever the size of the mailing. Rows are
+        # claimed with a lease so no two runners ever hold the same recipient;
+        # leases left behind by a crashed runner expire and are claimed again.
+        # Pacing, flood parking and the Telegram connection stay per process, so
+        # each account must still be driven by one runner: several runners only
+        # work side by side as owner shards (see app.worker --shards).
+        # ``ahead`` recipients of this runner are queued in front of the claim.
+        now = datetime.utcnow()
+        while True:
+            result = await session.execute(
+                select(MailingRecipient.id)
+                .where(
+                    MailingRecipient.mailing_id == mailing.id,
+                    MailingRecipient.status == RecipientStatus.pending,
+                    MailingRecipient.id > after_id,
+                    or_(MailingRecipient.lease_expires_at.is_(None), MailingRecipient.lease_expires_at < now),
+                    or_(MailingRecipient.next_attempt_at.is_(None), MailingRecipient.next_attempt_at <= now),
                 )
-                recipient.status = RecipientStatus.failed
-                recipient.error = str(exc)
-                append_recipient_log(mailing.id, recipient.user_id, recipient.username, str(exc))
-            await self._session.commit()
-            await asyncio.sleep(mailing.delay_seconds)
+                .order_by(MailingRecipient.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            ids = result.scalars().all()
+            if ids or after_id == 0:
+                break
+            # Wrap around once to pick up recipients left pending behind the cursor.
+            after_id = 0
+            self._cursors.pop(mailing.id, None)
+        if not ids:
+            await session.commit()
+            return []
+
+        lease_expires_at = now + timedelta(seconds=self._lease_seconds(mailing, ahead + len(ids)))
+        started = time.monotonic()
+        await session.execute(
+            update(MailingRecipient)
+            .where(MailingRecipient.id.in_(ids))
+            .values(leased_by=self._runner_id, lease_expires_at=lease_expires_at)
+        )
+        await session.commit()
+        db_commit_latency.observe(time.monotonic() - started, operation="lease_claim")
+        result = await session.execute(
+            select(
+                MailingRecipient.id,
+                MailingRecipient.user_id,
+                MailingRecipient.username,
+                MailingRecipient.access_hash,
+                MailingRecipient.access_hash_account_id,
+                MailingRecipient.attempt_round,
+                MailingRecipient.retry_count,
+            )
+            .where(MailingRecipient.id.in_(ids))
+            .order_by(MailingRecipient.id)
+        )
+        return result.all()
+
+    def _lease_seconds(self, mailing: Mailing, count: int) -> float:
+        # Long enough to send the whole batch at the mailing's pace.
+        pacer = self._pacers.get(self._mailing_accounts.get(mailing.id))
+        delay = pacer.delay_for(mailing.delay_seconds) if pacer else float(mailing.delay_seconds or 0)
+        return get_settings().mailing_lease_seconds + delay * count
+
+    async def _pending_wait(self, session: AsyncSession, mailing_id: int) -> Optional[float]:
+        # Seconds until a pending recipient can be claimed again: its lease expires
+        # or its next repeat round comes due. None when nothing is pending.
+        result = await session.execute(
+            select(
+                func.count(MailingRecipient.id),
+                func.min(MailingRecipient.lease_expires_at),
+                func.min(case((MailingRecipient.leased_by.is_(None), MailingRecipient.next_attempt_at))),
+            ).where(
+                MailingRecipient.mailing_id == mailing_id,
+                MailingRecipient.status == RecipientStatus.pending,
+            )
+        )
+        count, lease_expires_at, next_attempt_at = result.one()
+        if not count:
+            return None
+        due = [value for value in (lease_expires_at, next_attempt_at) if value is not None]
+        if not due:
+            # Rows are being claimed right now by another runner.
+            return 1.0
+        return max(0.0, (min(due) - datetime.utcnow()).total_seconds()) + 1.0
 
     async def _send_to_recipient(
         self,
         client,
+        account_id: int,
+        plan: SendPlan,
         mailing: Mailing,
-        recipient: MailingRecipient,
-        billing: BillingService,
+        recipient: Row,
+        target,
+        buffer: RecipientStatusBuffer,
         price_per_message: float,
     ) -> None:
-        repeat_count = int(getattr(mailing, "repeat_count", 1) or 1)
-        repeat_delay = float(getattr(mailing, "repeat_delay_seconds", 0) or 0)
-        repeat_count = max(1, repeat_count)
-
-        for idx in range(repeat_count):
-            if price_per_message > 0:
-                balance = await billing.get_balance(mailing.owner_id)
-                if balance < price_per_message:
-                    raise _InsufficientBalanceError()
-            await self._send_once(client, mailing, recipient)
-            if price_per_message > 0:
-                await billing.charge(mailing.owner_id, price_per_message, reason="mailing_message")
-            if idx < repeat_count - 1 and repeat_delay > 0:
-                await asyncio.sleep(repeat_delay)
-
-    async def _send_once(self, client, mailing: Mailing, recipient: MailingRecipient) -> None:
-        base_text = mailing.text or ""
-        if mailing.mention and recipient.username:
-            base_text = f"{base_text}\n@{recipient.username}" if base_text else f"@{recipient.username}"
-
-        target = await self._resolve_target_entity(client, mailing, recipient)
-        if not target:
-            raise RuntimeError(f"Could not resolve input entity for recipient={recipient.user_id}")
+        if not buffer.can_spend(mailing.owner_id, price_per_message):
+            raise _InsufficientBalanceError()
+        await self._send_once(client, account_id, plan, recipient, target)
+        buffer.spend(mailing.owner_id, price_per_message)
 
-        if mailing.message_type == MessageType.text:
-            await client.send_message(target, base_text)
-            return
+    async def _send_once(self, client, account_id: int, plan: SendPlan, recipient: Row, target) -> None:
+        if not target:
+            raise UnresolvedPeerError(f"Could not resolve input entity for recipient={recipient.user_id}")
 
-        if not mailing.media_path and not mailing.media_file_id:
-            await client.send_message(target, base_text)
-            return
-        if mailing.message_type == MessageType.sticker and mailing.sticker_set_name is not None:
-            if mailing.sticker_set_index is not None:
-                result = await client(
-                    GetStickerSetRequest(InputStickerSetShortName(mailing.sticker_set_name), hash=0)
-                )
-                if 0 <= mailing.sticker_set_index < len(result.documents):
-                    await client.send_file(target, result.documents[mailing.sticker_set_index], force_document=False)
-                    return
-            if mailing.media_file_id:
-                await client.send_file(target, mailing.media_file_id, force_document=False)
-                return
-        if mailing.message_type == MessageType.sticker and mailing.sticker_set_name is None:
-            if mailing.media_path:
-                media_path = self._resolve_media_path(mailing.media_path)
-                await client.send_file(target, media_path, force_document=False)
-                return
-            if mailing.media_file_id:
-                await client.send_file(target, mailing.media_file_id, force_document=False)
+        if plan.strategy == SendStrategy.sticker_set:
+            documents = await self._get_sticker_documents(client, account_id, plan.sticker_set_name)
+            if 0 <= plan.sticker_set_index < len(documents):
+                try:
+                    await client.send_file(target, documents[plan.sticker_set_index], force_document=False)
+                except FileReferenceExpiredError:
+                    get_sticker_set_cache().invalidate(account_id, plan.sticker_set_name)
+                    documents = await self._get_sticker_documents(client, account_id, plan.sticker_set_name)
+                    await client.send_file(target, documents[plan.sticker_set_index], force_document=False)
                 return
+            plan = plan.fallback
 
-        if not mailing.media_path:
-            await client.send_message(target, base_text)
-            return
-        media_path = self._resolve_media_path(mailing.media_path)
-
-        if mailing.message_type == MessageType.sticker:
-            attributes = [DocumentAttributeSticker(alt="🙂", stickerset=InputStickerSetEmpty())]
-            ext = Path(media_path).suffix.lower()
-            try:
-                if ext == ".webp":
-                    with Image.open(media_path) as image:
-                        width, height = image.size
-                    attributes.insert(0, DocumentAttributeImageSize(w=width, h=height))
-            except Exception:
-                pass
-            await client.send_file(
+        if plan.strategy == SendStrategy.text:
+            await client.send_message(
                 target,
-                media_path,
-                attributes=attributes,
-                force_document=ext in (".tgs", ".webm"),
+                plan.render_text(recipient.username),
+                formatting_entities=list(plan.entities),
             )
             return
 
-        if mailing.message_type == MessageType.voice:
-            await client.send_file(target, media_path)
-            return
+        kwargs = dict(plan.send_kwargs)
+        if plan.caption:
+            caption = plan.render_text(recipient.username)
+            kwargs["caption"] = caption or None
+            kwargs["formatting_entities"] = list(plan.entities)
+        await self._send_media(client, account_id, plan.mailing_id, target, plan.file, **kwargs)
 
-        await client.send_file(target, media_path, caption=base_text or None)
+    async def _send_media(self, client, account_id: int, mailing_id: int, target, file, **kwargs) -> None:
+        # Upload once per (mailing, account): later recipients get the server-side
+        # media of the first message, and a fresh upload only when its file
+        # reference has expired.
+        key = (mailing_id, account_id, str(file))
+        media = self._uploads.get(key)
+        if media is not None:
+            try:
+                await client.send_file(target, media, **kwargs)
+                return
+            except FileReferenceExpiredError:
+                self._uploads.invalidate(key)
+        message = await client.send_file(target, file, **kwargs)
+        media = getattr(message, "media", None)
+        if media is not None:
+            self._uploads.put(key, media)
 
-    def _resolve_media_path(self, media_path: str) -> str:
-        if os.path.isabs(media_path):
-            return media_path
-        return str((self._base_dir / media_path).resolve())
+    async def _get_sticker_documents(self, client, account_id: int, set_name: str) -> list:
+        async def load() -> list:
+            result = await client(GetStickerSetRequest(InputStickerSetShortName(set_name), hash=0))
+            return list(result.documents)
 
-    async def _resolve_target_entity(self, client, mailing: Mailing, recipient: MailingRecipient):
-        if mailing.target_source == TargetSource.chats:
-            if recipient.access_hash:
-                return InputPeerChannel(recipient.user_id, recipient.access_hash)
-            if recipient.username:
-                normalized = f"@{recipient.username.lstrip('@')}"
-                try:
-                    return await client.get_input_entity(normalized)
-                except (RPCError, ValueError):
-                    pass
-            try:
-                return InputPeerChat(recipient.user_id)
-            except (RPCError, ValueError):
-                pass
-            try:
-                return await client.get_input_entity(recipient.user_id)
-            except (RPCError, ValueError):
-                return None
+        return await get_sticker_set_cache().get_or_load(account_id, set_name, load)
 
-        if recipient.access_hash:
-            return InputPeerUser(recipient.user_id, recipient.access_hash)
+    def _peer_keys(self, mailing: Mailing, recipient: Row) -> List[str]:
+        keys = [username_key(recipient.username)] if recipient.username else []
+        if mailing.target_source != TargetSource.chats:
+            # Chat ids live in their own id space; they are only cached by username.
+            keys.append(id_key(recipient.user_id))
+        return keys
+
+    async def _resolve_target_entity(
+        self,
+        client,
+        account_id: int,
+        mailing: Mailing,
+        recipient: Row,
+        buffer: RecipientStatusBuffer,
+    ):
+        is_chat = mailing.target_source == TargetSource.chats
+        access_hash = self._stored_hash(recipient, account_id)
+        if access_hash:
+            if is_chat:
+                return InputPeerChannel(recipient.user_id, access_hash)
+            return InputPeerUser(recipient.user_id, access_hash)
+
+        keys = self._peer_keys(mailing, recipient)
+        for key in keys:
+            peer = self._peers.get(account_id, key)
+            if peer is not None:
+                return peer
+
+        peer = None
         if recipient.username:
-            normalized = f"@{recipient.username.lstrip('@')}"
-            try:
-                return await client.get_input_entity(normalized)
-            except (RPCError, ValueError):
-                pass
+            peer = await self._get_input_entity(client, f"@{recipient.username.lstrip('@')}")
+        if peer is None:
+            if is_chat:
+                return InputPeerChat(recipient.user_id)
+            peer = await self._get_input_entity(client, recipient.user_id)
+        if peer is None:
+            return None
+
+        described = describe_peer(peer)
+        if described is not None and described[0] != "chat":
+            peer_type, peer_id, access_hash = described
+            if peer_id != recipient.user_id:
+                # The username now points at someone else; keep the id key clear.
+                keys = [key for key in keys if key != id_key(recipient.user_id)]
+            for key in keys:
+                self._peers.put(account_id, key, peer)
+            buffer.add_resolved_peer(
+                ResolvedPeerWrite(
+                    account_id=account_id,
+                    owner_id=mailing.owner_id,
+                    recipient_id=recipient.id,
+                    recipient_user_id=recipient.user_id,
+                    keys=tuple(keys),
+                    peer_type=peer_type,
+                    peer_id=peer_id,
+                    access_hash=access_hash,
+                )
+            )
+        return peer
+
+    @staticmethod
+    def _stored_hash(recipient: Row, account_id: int) -> Optional[int]:
+        # Access hashes only work for the account that obtained them. Untagged
+        # ones predate the tracking and are used as before.
+        if recipient.access_hash_account_id not in (None, account_id):
+            return None
+        return recipient.access_hash
+
+    async def _get_input_entity(self, client, peer):
         try:
-            return await client.get_input_entity(recipient.user_id)
-        except (RPCError, ValueError):
+            return await client.get_input_entity(peer)
+        except ValueError:
+            return None
+        except RPCError as exc:
+            # Only a peer-level answer means "not resolvable"; flood waits, account
+            # and server errors reach the send stage and are handled there.
+            if isinstance(exc, FloodWaitError) or classify_error(exc) != ErrorClass.permanent:
+                raise
             return None
 
-    async def _resolve_account(self, mailing: Mailing) -> Optional[Account]:
+    async def _resolve_account(self, session: AsyncSession, mailing: Mailing) -> Optional[Account]:
         if mailing.account_id:
-            result = await self._session.execute(
+            result = await session.execute(
                 select(Account).where(Account.id == mailing.account_id, Account.owner_id == mailing.owner_id)
             )
             account = result.scalars().first()
             if account:
                 return account
-        return await AccountService(self._session).get_active_account(mailing.owner_id)
+        return await AccountService(session).get_active_account(mailing.owner_id)
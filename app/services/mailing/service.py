@@ -2,21 +2,37 @@ from __future__ import annotations
 
 import os
 from datetime import datetime
-from typing import Dict, List, Optional
-from sqlalchemy import delete, func, select
+from typing import Dict, List, Optional, Set
+from sqlalchemy import delete, insert, literal, null, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.models import (
+    Account,
     BotSubscriber,
+    DeadPeer,
     Mailing,
+    MailingCounter,
     MailingRecipient,
     MailingStatus,
     MessageType,
-    RecipientStatus,
     ParsedChat,
     ParsedUser,
     TargetSource,
 )
+from app.services.mailing.control import mailing_control
+from app.services.mailing.counters import add_to_counters, recount
+from app.services.mailing.dead_peers import not_dead_peer, peer_kind
+
+
+# Rows per multi-row INSERT (and per lookup query) when enqueueing target_ids.
+ENQUEUE_CHUNK_SIZE = 1000
+_RECIPIENT_COLUMNS = ("mailing_id", "user_id", "username", "access_hash", "access_hash_account_id")
+
+
+def _insert_recipients():
+    # The unique (mailing_id, user_id) index makes enqueue idempotent: rows
+    # already written by an interrupted run are skipped, not duplicated.
+    return insert(MailingRecipient.__table__).prefix_with("IGNORE", dialect="mysql")
 
 
 class MailingService:
@@ -59,17 +75,29 @@ class MailingService:
             limit_count=limit_count,
             repeat_delay_seconds=repeat_delay_seconds,
             repeat_count=repeat_count,
+            pending_target_ids=",".join(str(target_id) for target_id in target_ids) if target_ids else None,
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow(),
         )
         self._session.add(mailing)
+        await self._session.flush()
+        self._session.add(MailingCounter(mailing_id=mailing.id))
         await self._session.commit()
         await self._session.refresh(mailing)
-        if target_ids:
-            mailing._target_ids = target_ids
         await self._enqueue_recipients(mailing)
+        mailing_control.notify()
         return mailing
 
+    async def resume_enqueues(self) -> int:
+        """Finish enqueueing mailings whose enqueue was interrupted; returns how many there were."""
+        result = await self._session.execute(select(Mailing).where(Mailing.enqueued_at.is_(None)))
+        mailings = result.scalars().all()
+        for mailing in mailings:
+            await self._enqueue_recipients(mailing)
+        if mailings:
+            mailing_control.notify()
+        return len(mailings)
+
     async def pause(self, owner_id: int, mailing_id: int) -> bool:
         mailing = await self._get_mailing(owner_id, mailing_id)
         if not mailing:
@@ -77,6 +105,7 @@ class MailingService:
         mailing.status = MailingStatus.paused
         mailing.updated_at = datetime.utcnow()
         await self._session.commit()
+        mailing_control.halt(mailing_id)
         return True
 
     async def resume(self, owner_id: int, mailing_id: int) -> bool:
@@ -86,6 +115,8 @@ class MailingService:
         mailing.status = MailingStatus.running
         mailing.updated_at = datetime.utcnow()
         await self._session.commit()
+        mailing_control.release(mailing_id)
+        mailing_control.notify()
         return True
 
     async def get_status(self, owner_id: int, mailing_id: int) -> Optional[MailingStatus]:
@@ -95,27 +126,26 @@ class MailingService:
     async def get_mailing(self, owner_id: int, mailing_id: int) -> Optional[Mailing]:
         return await self._get_mailing(owner_id, mailing_id)
 
-    async def get_stats(self, owner_id: int, mailing_id: int) -> Dict[str, int]:
-        result = await self._session.execute(
-            select(func.count(MailingRecipient.id)).where(MailingRecipient.mailing_id == mailing_id)
-        )
-        total = int(result.scalar() or 0)
-        result = await self._session.execute(
-            select(func.count(MailingRecipient.id)).where(
-                MailingRecipient.mailing_id == mailing_id,
-                MailingRecipient.status == RecipientStatus.sent,
+    async def get_send_delay(self, mailing: Mailing) -> float:
+        """Pause actually kept between messages: the mailing delay or the account's learned interval."""
+        interval = None
+        if mailing.account_id:
+            result = await self._session.execute(
+                select(Account.send_interval_seconds).where(Account.id == mailing.account_id)
             )
-        )
-        sent = int(result.scalar() or 0)
+            interval = result.scalar()
+        return max(float(mailing.delay_seconds or 0), float(interval or 0))
+
+    async def get_stats(self, owner_id: int, mailing_id: int) -> Dict[str, int]:
         result = await self._session.execute(
-            select(func.count(MailingRecipient.id)).where(
-                MailingRecipient.mailing_id == mailing_id,
-                MailingRecipient.status == RecipientStatus.failed,
+            select(MailingCounter.total, MailingCounter.sent, MailingCounter.failed, MailingCounter.pending).where(
+                MailingCounter.mailing_id == mailing_id
             )
         )
-        failed = int(result.scalar() or 0)
-        pending = max(total - sent - failed, 0)
-        return {"total": total, "sent": sent, "failed": failed, "pending": pending}
+        row = result.first()
+        if row is None:
+            return {"total": 0, "sent": 0, "failed": 0, "pending": 0}
+        return {"total": row.total, "sent": row.sent, "failed": row.failed, "pending": row.pending}
 
     async def repeat(self, owner_id: int, mailing_id: int) -> Optional[Mailing]:
         mailing = await self._get_mailing(owner_id, mailing_id)
@@ -142,24 +172,33 @@ class MailingService:
             updated_at=datetime.utcnow(),
         )
         self._session.add(clone)
-        await self._session.commit()
-        await self._session.refresh(clone)
+        await self._session.flush()
+        self._session.add(MailingCounter(mailing_id=clone.id))
 
-        result = await self._session.execute(
-            select(MailingRecipient).where(MailingRecipient.mailing_id == mailing_id)
-        )
-        recipients = result.scalars().all()
-        for rec in recipients:
-            self._session.add(
-                MailingRecipient(
-                    mailing_id=clone.id,
-                    user_id=rec.user_id,
-                    username=rec.username,
-                    access_hash=rec.access_hash,
-                    status=RecipientStatus.pending,
+        # Cloned in the same transaction as the mailing row, so there is no
+        # partial state to resume.
+        await self._session.execute(
+            _insert_recipients().from_select(
+                _RECIPIENT_COLUMNS,
+                select(
+                    literal(clone.id),
+                    MailingRecipient.user_id,
+                    MailingRecipient.username,
+                    MailingRecipient.access_hash,
+                    MailingRecipient.access_hash_account_id,
                 )
+                .where(
+                    MailingRecipient.mailing_id == mailing_id,
+                    not_dead_peer(owner_id, peer_kind(mailing.target_source), MailingRecipient.user_id),
+                )
+                .order_by(MailingRecipient.id),
             )
+        )
+        await recount(self._session, clone.id)
+        clone.enqueued_at = datetime.utcnow()
         await self._session.commit()
+        await self._session.refresh(clone)
+        mailing_control.notify()
         return clone
 
     async def update_content(
@@ -195,8 +234,10 @@ class MailingService:
         await self._session.execute(
             delete(MailingRecipient).where(MailingRecipient.mailing_id == mailing_id)
         )
+        await self._session.execute(delete(MailingCounter).where(MailingCounter.mailing_id == mailing_id))
         await self._session.delete(mailing)
         await self._session.commit()
+        mailing_control.halt(mailing_id)
         if media_path and os.path.isfile(media_path):
             try:
                 os.remove(media_path)
@@ -211,80 +252,132 @@ class MailingService:
         return result.scalars().first()
 
     async def _enqueue_recipients(self, mailing: Mailing) -> None:
+        # Recipients are written by the database (INSERT ... SELECT) or in
+        # multi-row chunks; a large audience never becomes ORM objects here.
+        # Safe to run again for the same mailing, which is how an interrupted
+        # enqueue is resumed.
         limit = mailing.limit_count or 0
-        count = 0
+        # Peers that failed permanently before are never enqueued again.
+        kind = peer_kind(mailing.target_source)
 
-        if hasattr(mailing, "_target_ids") and mailing._target_ids:
-            target_ids = list(mailing._target_ids)
-            ids_set = set(target_ids)
-            resolved = {}
+        if mailing.pending_target_ids:
+            target_ids = [int(value) for value in mailing.pending_target_ids.split(",") if value]
+            mailing.duplicate_count = await self._enqueue_target_ids(mailing, target_ids, kind, limit)
+        else:
+            await self._enqueue_from_source(mailing, kind, limit)
+        # Chunks only add to the counters as they go; the final count also
+        # settles rows a resumed enqueue skipped as already present.
+        await recount(self._session, mailing.id)
+        mailing.pending_target_ids = None
+        mailing.enqueued_at = datetime.utcnow()
+        await self._session.commit()
 
-            if mailing.target_source == TargetSource.chats:
-                result = await self._session.execute(
-                    select(ParsedChat).where(
-                        ParsedChat.owner_id == mailing.owner_id,
-                        ParsedChat.chat_id.in_(ids_set),
-                    )
-                )
-                for chat in result.scalars().all():
-                    resolved[chat.chat_id] = chat
-            elif mailing.target_source == TargetSource.parsed:
-                result = await self._session.execute(
-                    select(ParsedUser).where(
-                        ParsedUser.owner_id == mailing.owner_id,
-                        ParsedUser.user_id.in_(ids_set),
-                    )
-                )
-                for user in result.scalars().all():
-                    resolved[user.user_id] = user
-            elif mailing.target_source == TargetSource.subscribers:
-                result = await self._session.execute(
-                    select(BotSubscriber).where(BotSubscriber.user_id.in_(ids_set))
+    async def _enqueue_from_source(self, mailing: Mailing, kind: str, limit: int) -> None:
+        if mailing.target_source == TargetSource.subscribers:
+            source = select(
+                literal(mailing.id), BotSubscriber.user_id, BotSubscriber.username, null(), null()
+            ).where(not_dead_peer(mailing.owner_id, kind, BotSubscriber.user_id))
+            order_column = BotSubscriber.id
+        elif mailing.target_source == TargetSource.parsed:
+            source = select(
+                literal(mailing.id),
+                ParsedUser.user_id,
+                ParsedUser.username,
+                ParsedUser.access_hash,
+                ParsedUser.access_hash_account_id,
+            ).where(
+                ParsedUser.owner_id == mailing.owner_id,
+                not_dead_peer(mailing.owner_id, kind, ParsedUser.user_id),
+            )
+            order_column = ParsedUser.id
+        else:
+            source = select(
+                literal(mailing.id),
+                ParsedChat.chat_id,
+                ParsedChat.username,
+                ParsedChat.access_hash,
+                ParsedChat.access_hash_account_id,
+            ).where(
+                ParsedChat.owner_id == mailing.owner_id,
+                not_dead_peer(mailing.owner_id, kind, ParsedChat.chat_id),
+            )
+            if mailing.chat_id:
+                source = source.where(ParsedChat.chat_id == mailing.chat_id)
+            order_column = ParsedChat.id
+
+        source = source.order_by(order_column)
+        if limit:
+            source = source.limit(limit)
+        await self._session.execute(_insert_recipients().from_select(_RECIPIENT_COLUMNS, source))
+
+    async def _enqueue_target_ids(self, mailing: Mailing, target_ids: List[int], kind: str, limit: int) -> int:
+        """Insert the targets chunk by chunk, committing each; return how many repeated ids were dropped."""
+        if mailing.target_source == TargetSource.chats:
+            lookup = select(
+                ParsedChat.chat_id, ParsedChat.username, ParsedChat.access_hash, ParsedChat.access_hash_account_id
+            ).where(
+                ParsedChat.owner_id == mailing.owner_id
+            )
+            id_column = ParsedChat.chat_id
+        elif mailing.target_source == TargetSource.parsed:
+            lookup = select(
+                ParsedUser.user_id, ParsedUser.username, ParsedUser.access_hash, ParsedUser.access_hash_account_id
+            ).where(
+                ParsedUser.owner_id == mailing.owner_id
+            )
+            id_column = ParsedUser.user_id
+        else:
+            lookup = select(BotSubscriber.user_id, BotSubscriber.username, null(), null())
+            id_column = BotSubscriber.user_id
+
+        count = 0
+        duplicates = 0
+        seen: Set[int] = set()
+        for chunk in _chunked(target_ids, ENQUEUE_CHUNK_SIZE):
+            if limit and count >= limit:
+                break
+            ids_set = set(chunk)
+            result = await self._session.execute(
+                select(DeadPeer.peer_id).where(
+                    DeadPeer.owner_id == mailing.owner_id,
+                    DeadPeer.peer_kind == kind,
+                    DeadPeer.peer_id.in_(ids_set),
+                    DeadPeer.expires_at > datetime.utcnow(),
                 )
-                for user in result.scalars().all():
-                    resolved[user.user_id] = user
+            )
+            dead_ids = set(result.scalars().all())
+            result = await self._session.execute(lookup.where(id_column.in_(ids_set)))
+            resolved = {row[0]: row for row in result.all()}
 
-            for target_id in target_ids:
+            rows = []
+            for target_id in chunk:
                 if limit and count >= limit:
                     break
+                if target_id in seen:
+                    duplicates += 1
+                    continue
+                seen.add(target_id)
+                if target_id in dead_ids:
+                    continue
                 entity = resolved.get(target_id)
-                recipient = MailingRecipient(
-                    mailing_id=mailing.id,
-                    user_id=target_id,
-                    username=getattr(entity, "username", None),
-                    access_hash=getattr(entity, "access_hash", None),
+                rows.append(
+                    {
+                        "mailing_id": mailing.id,
+                        "user_id": target_id,
+                        "username": entity[1] if entity else None,
+                        "access_hash": entity[2] if entity else None,
+                        "access_hash_account_id": entity[3] if entity else None,
+                    }
                 )
-                self._session.add(recipient)
                 count += 1
+            if rows:
+                # executemany: SQLAlchemy sends these as batched multi-row INSERTs.
+                await self._session.execute(_insert_recipients(), rows)
+                await add_to_counters(self._session, mailing.id, total=len(rows), pending=len(rows))
             await self._session.commit()
-            return
-
-        if mailing.target_source == TargetSource.subscribers:
-            result = await self._session.execute(select(BotSubscriber))
-            recipients = result.scalars().all()
-        elif mailing.target_source == TargetSource.parsed:
-            result = await self._session.execute(select(ParsedUser).where(ParsedUser.owner_id == mailing.owner_id))
-            recipients = result.scalars().all()
-        else:
-            chat_query = select(ParsedChat).where(ParsedChat.owner_id == mailing.owner_id)
-            if mailing.chat_id:
-                chat_query = chat_query.where(ParsedChat.chat_id == mailing.chat_id)
-            result = await self._session.execute(chat_query)
-            recipients = result.scalars().all()
+        return duplicates
 
-        for user in recipients:
-            if limit and count >= limit:
-                break
-            target_id = getattr(user, "user_id", None)
-            if target_id is None:
-                target_id = getattr(user, "chat_id", None)
-            recipient = MailingRecipient(
-                mailing_id=mailing.id,
-                user_id=target_id,
-                username=getattr(user, "username", None),
-                access_hash=getattr(user, "access_hash", None),
-            )
-            self._session.add(recipient)
-            count += 1
 
-        await self._session.commit()
+def _chunked(values: List[int], size: int):
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+from app.core.config import get_settings
+
+
+class StickerSetCache:
+    """TTL + LRU cache of resolved sticker sets keyed by (scope, short name).
+
+    The scope is the Telegram account id for documents fetched through
+    Telethon (file references are bound to the account that fetched them) and
+    ``"bot"`` for sticker sets fetched through the Bot API.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self._max_entries = max(1, max_entries)
+        self._ttl = ttl_seconds
+        self._entries: "OrderedDict[Tuple[Hashable, str], Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, scope: Hashable, name: str) -> Optional[Any]:
+        key = (scope, name)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, scope: Hashable, name: str, value: Any) -> None:
+        key = (scope, name)
+        self._entries[key] = (time.monotonic() + self._ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, scope: Hashable, name: str) -> None:
+        self._entries.pop((scope, name), None)
+
+    async def get_or_load(self, scope: Hashable, name: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.get(scope, name)
+        if value is None:
+            value = await loader()
+            self.put(scope, name, value)
+        return value
+
+
+_sticker_set_cache: Optional[StickerSetCache] = None
+
+
+def get_sticker_set_cache() -> StickerSetCache:
+    global _sticker_set_cache
+    if _sticker_set_cache is None:
+        settings = get_settings()
+        _sticker_set_cache = StickerSetCache(settings.sticker_cache_size, settings.sticker_cache_ttl_seconds)
+    return _sticker_set_cache
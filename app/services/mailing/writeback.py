@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import db_commit_latency
+from app.db.models import MailingRecipient, RecipientStatus
+from app.services.mailing.counters import add_to_counters
+from app.services.mailing.dead_peers import DeadPeerWrite, save_dead_peers
+from app.services.mailing.peers import ResolvedPeerWrite, save_resolved_peers
+from app.services.billing import BillingService
+
+
+# Tolerance for float rounding when spending a reservation in price steps.
+_EPSILON = 1e-9
+
+
+# Attempts at writing the last rows of a turn before giving up on them.
+CLOSE_WRITE_ATTEMPTS = 3
+
+
+@dataclass
+class _Reservation:
+    tx_id: int
+    reserved: float
+    reason: str
+    spent: float = 0.0
+    # Part of ``spent`` already moved to the charge row ``charge_tx_id``.
+    written: float = 0.0
+    charge_tx_id: Optional[int] = None
+
+
+@dataclass
+class _Pending:
+    rows: List[dict]
+    finished: Dict[RecipientStatus, int]
+    peers: List[ResolvedPeerWrite]
+    dead_peers: List[DeadPeerWrite]
+
+
+class RecipientStatusBuffer:
+    """Collects recipient status changes and spends from billing reservations.
+
+    Rows are flushed as one executemany UPDATE by primary key every
+    ``flush_size`` recipients or ``flush_interval_ms`` milliseconds, whichever
+    comes first. Funds are held once per batch with :meth:`BillingService.reserve`
+    and spent in memory while sending; every flush charges what the flushed
+    rows spent in the same commit, and :meth:`close` gives back the rest. A
+    hold left behind by a crash expires and is released by
+    :meth:`BillingService.release_expired_holds`. Peers resolved over the network and peers
+    found undeliverable ride along with the status rows, and so do the
+    mailing_counters deltas of the flushed rows.
+
+    The runner pipeline reserves from its prefetch stage while the record stage
+    flushes, so every use of the session goes through :attr:`lock`.
+    """
+
+    def __init__(self, session: AsyncSession, mailing_id: int, flush_size: int, flush_interval_ms: int) -> None:
+        self._session = session
+        self._mailing_id = mailing_id
+        self._flush_size = max(1, flush_size)
+        self._flush_interval = max(0, flush_interval_ms) / 1000.0
+        self._rows: List[dict] = []
+        self._finished: Dict[RecipientStatus, int] = {}
+        self._reservations: Dict[int, List[_Reservation]] = {}
+        self._released: List[int] = []
+        self._peers: List[ResolvedPeerWrite] = []
+        self._dead_peers: List[DeadPeerWrite] = []
+        self._runner_id: Optional[str] = None
+        self._last_flush = time.monotonic()
+        self._retry_at = 0.0
+        self.lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, recipient_id: int, status: RecipientStatus, error: Optional[str] = None) -> None:
+        self._finished[status] = self._finished.get(status, 0) + 1
+        self._rows.append(
+            {
+                "id": recipient_id,
+                "status": status,
+                "sent_at": datetime.utcnow() if status == RecipientStatus.sent else None,
+                "error": error,
+                "leased_by": None,
+                "lease_expires_at": None,
+            }
+        )
+
+    def reschedule(self, recipient_id: int, attempt_round: int, next_attempt_at: datetime) -> None:
+        """Keep the recipient pending for its next repeat round."""
+        self._rows.append(
+            {
+                "id": recipient_id,
+                "attempt_round": attempt_round,
+                "next_attempt_at": next_attempt_at,
+                "leased_by": None,
+                "lease_expires_at": None,
+            }
+        )
+
+    def retry_later(self, recipient_id: int, retry_count: int, next_attempt_at: datetime, error: str) -> None:
+        """Keep the recipient pending after a transient failure."""
+        self._rows.append(
+            {
+                "id": recipient_id,
+                "retry_count": retry_count,
+                "next_attempt_at": next_attempt_at,
+                "error": error,
+                "leased_by": None,
+                "lease_expires_at": None,
+            }
+        )
+
+    def add_resolved_peer(self, write: ResolvedPeerWrite) -> None:
+        self._peers.append(write)
+
+    def add_dead_peer(self, write: DeadPeerWrite) -> None:
+        self._dead_peers.append(write)
+
+    def release_leases(self, recipient_ids: List[int], runner_id: str) -> None:
+        """Give back leases of claimed recipients that stay pending, on close."""
+        self._released.extend(recipient_ids)
+        self._runner_id = runner_id
+
+    async def reserve(self, owner_id: int, amount: float, unit: float, reason: str, expires_at: datetime) -> None:
+        async with self.lock:
+            reserved, tx_id = await BillingService(self._session).reserve(
+                owner_id, amount, unit, reason=reason, expires_at=expires_at
+            )
+        if tx_id is not None:
+            self._reservations.setdefault(owner_id, []).append(_Reservation(tx_id=tx_id, reserved=reserved, reason=reason))
+
+    async def held_elsewhere(self, owner_id: int) -> bool:
+        """Whether another turn holds part of the owner's balance and will give it back."""
+        own = [item.tx_id for item in self._reservations.get(owner_id, [])]
+        async with self.lock:
+            return await BillingService(self._session).has_holds(owner_id, exclude=own)
+
+    def can_spend(self, owner_id: int, amount: float) -> bool:
+        if amount <= 0:
+            return True
+        available = sum(item.reserved - item.spent for item in self._reservations.get(owner_id, []))
+        return available + _EPSILON >= amount
+
+    def spend(self, owner_id: int, amount: float) -> None:
+        for reservation in self._reservations.get(owner_id, []):
+            if amount <= _EPSILON:
+                return
+            part = min(amount, reservation.reserved - reservation.spent)
+            if part > 0:
+                reservation.spent += part
+                amount -= part
+
+    def is_due(self) -> bool:
+        if not self._rows:
+            return False
+        if len(self._rows) >= self._flush_size and time.monotonic() >= self._retry_at:
+            return True
+        return time.monotonic() - self._last_flush >= self._flush_interval
+
+    async def flush_if_due(self) -> None:
+        if self.is_due():
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write the buffered rows; on failure they are put back and retried by a later flush."""
+        async with self.lock:
+            pending = self._take()
+            started = time.monotonic()
+            try:
+                charged = await self._write(pending)
+                await self._session.commit()
+            except Exception:
+                await self._session.rollback()
+                self._restore(pending)
+                # Back off for one interval instead of retrying on every outcome.
+                self._last_flush = time.monotonic()
+                self._retry_at = self._last_flush + self._flush_interval
+                raise
+            self._mark_charged(charged)
+            db_commit_latency.observe(time.monotonic() - started, operation="status_flush")
+        self._last_flush = time.monotonic()
+
+    async def close(self) -> None:
+        """Flush pending rows, release leases and settle reservations.
+
+        Reservations are settled even when the rows cannot be written, which is
+        retried a few times first; the write error is raised afterwards.
+        """
+        async with self.lock:
+            pending = self._take()
+            released, self._released = self._released, []
+            started = time.monotonic()
+            try:
+                for attempt in range(CLOSE_WRITE_ATTEMPTS):
+                    try:
+                        charged = await self._write(pending)
+                        if released:
+                            await self._session.execute(
+                                update(MailingRecipient)
+                                .where(MailingRecipient.id.in_(released), MailingRecipient.leased_by == self._runner_id)
+                                .values(leased_by=None, lease_expires_at=None)
+                            )
+                        await self._session.commit()
+                        self._mark_charged(charged)
+                        break
+                    except Exception:
+                        await self._session.rollback()
+                        if attempt + 1 == CLOSE_WRITE_ATTEMPTS:
+                            raise
+            finally:
+                reservations, self._reservations = self._reservations, {}
+                billing = BillingService(self._session)
+                for owner_id, items in reservations.items():
+                    for reservation in items:
+                        await billing.settle(owner_id, reservation.tx_id)
+            db_commit_latency.observe(time.monotonic() - started, operation="status_close")
+        self._last_flush = time.monotonic()
+
+    def _take(self) -> _Pending:
+        pending = _Pending(self._rows, self._finished, self._peers, self._dead_peers)
+        self._rows, self._finished, self._peers, self._dead_peers = [], {}, [], []
+        return pending
+
+    def _restore(self, pending: _Pending) -> None:
+        self._rows = pending.rows + self._rows
+        for status, count in pending.finished.items():
+            self._finished[status] = self._finished.get(status, 0) + count
+        self._peers = pending.peers + self._peers
+        self._dead_peers = pending.dead_peers + self._dead_peers
+
+    async def _write(self, pending: _Pending) -> List[Tuple[_Reservation, float, int]]:
+        """Write the rows and charge what they spent; returns the charges to mark once committed."""
+        billing = BillingService(self._session)
+        charged = []
+        for owner_id, items in self._reservations.items():
+            for reservation in items:
+                amount = reservation.spent - reservation.written
+                if amount > _EPSILON:
+                    charge_tx_id = await billing.spend_reserved(
+                        owner_id, reservation.tx_id, reservation.charge_tx_id, amount, reason=reservation.reason
+                    )
+                    charged.append((reservation, reservation.spent, charge_tx_id))
+        if pending.rows:
+            await update_recipients(self._session, pending.rows)
+            sent = pending.finished.get(RecipientStatus.sent, 0)
+            failed = pending.finished.get(RecipientStatus.failed, 0)
+            await add_to_counters(self._session, self._mailing_id, sent=sent, failed=failed, pending=-(sent + failed))
+        await save_resolved_peers(self._session, pending.peers)
+        await save_dead_peers(self._session, pending.dead_peers)
+        return charged
+
+    @staticmethod
+    def _mark_charged(charged: List[Tuple[_Reservation, float, int]]) -> None:
+        for reservation, spent, charge_tx_id in charged:
+            reservation.written = spent
+            reservation.charge_tx_id = charge_tx_id
+
+
+async def update_recipients(session: AsyncSession, rows: List[dict]) -> None:
+    """Executemany UPDATE of recipient rows by ``id``, grouped by the columns each row sets.
+
+    Core statements rather than the ORM bulk update: a row deleted meanwhile
+    (its mailing was deleted mid-turn) matches nothing instead of failing the
+    whole batch with StaleDataError.
+    """
+    table = MailingRecipient.__table__
+    groups: Dict[Tuple[str, ...], List[dict]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(key for key in row if key != "id")), []).append(row)
+    for columns, group in groups.items():
+        await session.execute(
+            update(table).where(table.c.id == bindparam("b_id")),
+            [{"b_id": row["id"], **{column: row[column] for column in columns}} for row in group],
+        )
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import functools
+import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Optional
@@ -20,9 +22,26 @@ from telethon.tl.types import (
 )
 
 from app.client.telethon_manager import TelethonManager
+from app.core.metrics import parser_run_seconds, parser_users
 from app.db.models import Account, ParsedChat, ParsedUser, ParseFilter
 
 
+def _observed(method):
+    """Record run duration and the number of stored rows of a parse method."""
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs) -> int:
+        started = time.monotonic()
+        try:
+            added = await method(*args, **kwargs)
+        finally:
+            parser_run_seconds.observe(time.monotonic() - started, method=method.__name__)
+        parser_users.inc(added, method=method.__name__)
+        return added
+
+    return wrapper
+
+
 class ParserService:
     def __init__(self, session: AsyncSession, manager: TelethonManager) -> None:
         self._session = session
@@ -147,6 +166,7 @@ class ParserService:
 
         return True
 
+    @_observed
     async def parse_chat(
         self,
         account: Account,
@@ -176,6 +196,7 @@ class ParserService:
                 first_name=user.first_name,
                 last_name=user.last_name,
                 access_hash=getattr(user, "access_hash", None),
+                access_hash_account_id=account.id,
                 source=chat,
             )
             self._session.add(parsed)
@@ -185,6 +206,7 @@ class ParserService:
         await self._session.commit()
         return added
 
+    @_observed
     async def parse_chat_history(
         self,
         account: Account,
@@ -265,6 +287,7 @@ class ParserService:
                     first_name=entity.first_name,
                     last_name=entity.last_name,
                     access_hash=getattr(entity, "access_hash", None),
+                    access_hash_account_id=account.id,
                     source=chat,
                 )
                 self._session.add(parsed)
@@ -273,6 +296,7 @@ class ParserService:
         await self._session.commit()
         return added
 
+    @_observed
     async def parse_groups(self, account: Account, owner_id: int, max_chats: Optional[int] = None) -> int:
         client = await self._manager.get_client(account)
         added = 0
@@ -305,6 +329,7 @@ class ParserService:
                 username=username,
                 chat_type=chat_type,
                 access_hash=getattr(entity, "access_hash", None),
+                access_hash_account_id=account.id,
             )
             self._session.add(parsed)
             added += 1
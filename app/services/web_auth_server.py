@@ -6,6 +6,7 @@ from http.server import BaseHTTPRequestHandler, HTTPServer
 from pathlib import Path
 from urllib.parse import parse_qs, urlparse
 
+from app.core.metrics import send_metrics
 from app.services.auth_registry import auth_flow_manager
 
 WEB_AUTH_DIST = Path(__file__).resolve().parent.parent / "web_auth" / "dist"
@@ -14,6 +15,10 @@ WEB_AUTH_DIST = Path(__file__).resolve().parent.parent / "web_auth" / "dist"
 class _Handler(BaseHTTPRequestHandler):
     def do_GET(self):
         path = urlparse(self.path).path
+        if path == "/metrics":
+            send_metrics(self)
+            return
+
         if path.startswith("/assets/"):
             self._send_static(path)
             return
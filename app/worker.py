@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import multiprocessing
+from typing import Optional
+
+from app.client.telethon_manager import TelethonManager
+from app.core.config import get_settings
+from app.core.logger import setup_logging
+from app.core.metrics import MetricsServer
+from app.db.session import get_session_factory
+from app.services.mailing.runner import MailingRunner
+
+
+async def run_mailing_worker(shard_index: int = 0, shard_count: int = 1) -> None:
+    manager = TelethonManager()
+    runner = MailingRunner(get_session_factory(), manager, shard_index=shard_index, shard_count=shard_count)
+    try:
+        await runner.run_forever()
+    finally:
+        await manager.close_all()
+
+
+def _run_shard(shard_index: int, shard_count: int) -> None:
+    setup_logging()
+    settings = get_settings()
+    if settings.metrics_port is not None:
+        MetricsServer(settings.metrics_host, settings.metrics_port + shard_index).start()
+    try:
+        asyncio.run(run_mailing_worker(shard_index, shard_count))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv: Optional[list] = None) -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Run mailing sending outside the bot process.")
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=settings.mailing_worker_shards,
+        help="Total number of worker shards; mailings are split by owner_id modulo this value.",
+    )
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        default=None,
+        help="Run only this shard in the current process. Without it, one process per shard is started.",
+    )
+    args = parser.parse_args(argv)
+    shard_count = max(1, args.shards)
+
+    if args.shard_index is not None:
+        if not 0 <= args.shard_index < shard_count:
+            parser.error("--shard-index must be between 0 and --shards - 1")
+        _run_shard(args.shard_index, shard_count)
+        return
+    if shard_count == 1:
+        _run_shard(0, 1)
+        return
+
+    processes = [
+        multiprocessing.Process(target=_run_shard, args=(index, shard_count), name=f"mailing-worker-{index}")
+        for index in range(shard_count)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
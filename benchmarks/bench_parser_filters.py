@@ -0,0 +1,98 @@
+"""Micro-benchmark: ParserService filter evaluation per participant.
+
+Runs ParserService._passes_filters over a fixed population of generated users
+for a few representative filter settings. No database or Telegram needed.
+
+    python -m benchmarks.bench_parser_filters --users 100000 --output results/parser_filters.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from telethon.tl.types import (
+    User,
+    UserStatusEmpty,
+    UserStatusLastMonth,
+    UserStatusLastWeek,
+    UserStatusOffline,
+    UserStatusOnline,
+    UserStatusRecently,
+)
+
+from app.services.parser import ParserService, ParseFilterSettings
+from benchmarks.common import emit
+
+
+FIRST_NAMES = ("Olena", "Андрій", "Ivan", "Марія", "John", "Anna", "Дмитро", "Kate", "Олег", "", None)
+LAST_NAMES = ("Shevchenko", "Коваленко", "Smith", "", None)
+
+FILTERS = {
+    "default": ParseFilterSettings(status="all", gender="any", language="any", activity="any"),
+    "users_only": ParseFilterSettings(status="users", gender="any", language="any", activity="any"),
+    "female_ru": ParseFilterSettings(status="all", gender="female", language="ru", activity="any"),
+    "active_week": ParseFilterSettings(status="all", gender="any", language="any", activity="week"),
+    "everything": ParseFilterSettings(status="users", gender="male", language="en", activity="recent"),
+}
+
+
+def generate_users(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    statuses = (
+        lambda: UserStatusOnline(expires=now),
+        UserStatusRecently,
+        UserStatusLastWeek,
+        UserStatusLastMonth,
+        UserStatusEmpty,
+        lambda: UserStatusOffline(was_online=now - timedelta(days=rng.randrange(60))),
+        lambda: None,
+    )
+    return [
+        User(
+            id=index,
+            bot=rng.random() < 0.02,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            status=rng.choice(statuses)(),
+        )
+        for index in range(count)
+    ]
+
+
+def measure(users: list, repeats: int) -> dict:
+    service = ParserService(None, None)
+    admin_ids = {user.id for user in users[:50]}
+    results = {}
+    for name, filters in FILTERS.items():
+        best = None
+        passed = 0
+        for _ in range(repeats):
+            started = time.perf_counter()
+            passed = sum(1 for user in users if service._passes_filters(user, filters, admin_ids))
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = {
+            "passed": passed,
+            "per_user_us": round(best / len(users) * 1e6, 3),
+            "users_per_second": round(len(users) / best, 1) if best else None,
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--repeats", type=int, default=3, help="Best of this many passes is reported.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Also write the JSON result to this file.")
+    args = parser.parse_args()
+    results = measure(generate_users(args.users, args.seed), args.repeats)
+    emit("parser_filters", {"users": args.users, "repeats": args.repeats, "seed": args.seed}, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Micro-benchmark: per-send overhead of the legacy decision tree vs a compiled SendPlan.
+
+Both paths run against a no-op client, so the numbers only contain the work
+done in Python before a request would reach Telegram: branching on the
+mailing type, resolving the media path, reading WebP dimensions and parsing
+markdown (which Telethon does inside send_message/send_file unless
+formatting entities are passed in).
+
+    python -m benchmarks.bench_send_plan --iterations 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from PIL import Image
+from telethon.extensions import markdown
+from telethon.tl.types import DocumentAttributeImageSize, DocumentAttributeSticker, InputStickerSetEmpty
+
+from app.db.models import Mailing, MessageType, TargetSource
+from app.services.mailing.plan import compile_send_plan, resolve_media_path
+from app.services.mailing.runner import MailingRunner
+from benchmarks.common import emit
+
+
+TEXT = "**Hello** there, check __this__ out: [link](https://example.com) and `code`"
+
+
+class NoopClient:
+    async def send_message(self, entity, message="", formatting_entities=None, **kwargs):
+        if formatting_entities is None:
+            markdown.parse(message)
+        return SimpleNamespace(media=None)
+
+    async def send_file(self, entity, file, caption=None, formatting_entities=None, **kwargs):
+        if caption and formatting_entities is None:
+            markdown.parse(caption)
+        return SimpleNamespace(media=None)
+
+
+async def legacy_send_once(client, mailing: Mailing, recipient, base_dir: Path) -> None:
+    # The per-recipient branching _send_once did before SendPlan.
+    base_text = mailing.text or ""
+    if mailing.mention and recipient.username:
+        base_text = f"{base_text}\n@{recipient.username}" if base_text else f"@{recipient.username}"
+    target = recipient.user_id
+    if mailing.message_type == MessageType.text:
+        await client.send_message(target, base_text)
+        return
+    media_path = resolve_media_path(mailing.media_path, base_dir)
+    if mailing.message_type == MessageType.sticker:
+        attributes = [DocumentAttributeSticker(alt="🙂", stickerset=InputStickerSetEmpty())]
+        ext = Path(media_path).suffix.lower()
+        if ext == ".webp":
+            with Image.open(media_path) as image:
+                width, height = image.size
+            attributes.insert(0, DocumentAttributeImageSize(w=width, h=height))
+        await client.send_file(target, media_path, attributes=attributes, force_document=ext in (".tgs", ".webm"))
+        return
+    await client.send_file(target, media_path, caption=base_text or None)
+
+
+def build_mailing(message_type: MessageType, media_path) -> Mailing:
+    return Mailing(
+        id=1,
+        owner_id=1,
+        status=None,
+        message_type=message_type,
+        text=TEXT,
+        media_path=media_path,
+        media_file_id=None,
+        sticker_set_name=None,
+        sticker_set_index=None,
+        mention=True,
+        target_source=TargetSource.parsed,
+    )
+
+
+async def measure(iterations: int, media_dir: Path) -> dict:
+    webp = media_dir / "sticker.webp"
+    Image.new("RGBA", (512, 512)).save(webp)
+    photo = media_dir / "photo.jpg"
+    Image.new("RGB", (64, 64)).save(photo)
+
+    runner = MailingRunner(None, None)
+    client = NoopClient()
+    recipient = SimpleNamespace(id=1, user_id=42, username="someone", access_hash=1234)
+    results = {}
+    for name, message_type, media_path in (
+        ("text", MessageType.text, None),
+        ("photo", MessageType.photo, str(photo)),
+        ("sticker_webp", MessageType.sticker, str(webp)),
+    ):
+        mailing = build_mailing(message_type, media_path)
+        if message_type == MessageType.sticker:
+            # Take the path-based sticker branch that reads WebP dimensions.
+            mailing.sticker_set_name = ""
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await legacy_send_once(client, mailing, recipient, media_dir)
+        before = (time.perf_counter() - started) / iterations
+
+        started = time.perf_counter()
+        plan = compile_send_plan(mailing, media_dir)
+        for _ in range(iterations):
+            await runner._send_once(client, 1, plan, recipient, recipient.user_id)
+        after = (time.perf_counter() - started) / iterations
+
+        results[name] = {
+            "before_us": round(before * 1e6, 2),
+            "after_us": round(after * 1e6, 2),
+            "speedup": round(before / after, 2) if after else None,
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--output", default=None, help="Also write the JSON result to this file.")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        results = asyncio.run(measure(args.iterations, Path(tmp)))
+    emit("send_plan", {"iterations": args.iterations}, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
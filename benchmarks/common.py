@@ -0,0 +1,83 @@
+"""Shared helpers: JSON result envelope and database query counting."""
+
+from __future__ import annotations
+
+import json
+import platform
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def emit(benchmark: str, params: dict, results: Any, output: Optional[str] = None) -> dict:
+    """Print the result envelope and optionally write it to ``output``.
+
+    Keep one file per run (e.g. ``results/<revision>/<benchmark>.json``) and
+    diff them between versions to spot regressions.
+    """
+    payload = {
+        "benchmark": benchmark,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "params": params,
+        "results": results,
+    }
+    text = json.dumps(payload, indent=2, default=str)
+    print(text)
+    if output:
+        path = Path(output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text + "\n")
+    return payload
+
+
+class QueryCounter:
+    def __init__(self) -> None:
+        self.queries = 0
+
+    def __call__(self, *args) -> None:
+        self.queries += 1
+
+
+@contextmanager
+def count_queries(engine: AsyncEngine) -> Iterator[QueryCounter]:
+    counter = QueryCounter()
+    event.listen(engine.sync_engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", counter)
+
+
+@contextmanager
+def timed() -> Iterator[dict]:
+    timing = {"seconds": 0.0}
+    started = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing["seconds"] = time.perf_counter() - started